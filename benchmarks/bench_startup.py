@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""
+Time the CLI startup, before any command reaches the daemon
+
+    python benchmarks/bench_startup.py [runs] [budget ms]
+
+The import cost of the entry point is read from python -X importtime,
+the wall time from repeated runs of tlever --help. With a budget the
+script exits with 1 when the cumulative import time goes over it.
+"""
+
+import sys
+import time
+import subprocess
+
+ENTRY_POINT = "transmission_lever.tlever"
+
+# imported by commands only, seeing them at startup means an eager import came back
+HEAVY_MODULES = ("transmission_rpc", "requests", "sqlite3", "numpy")
+
+
+def import_times(statement: str) -> dict:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, check=True)
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = int(cumulative)
+
+    return times
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    # modules the interpreter loads on its own are not ours to count
+    baseline = import_times("pass")
+    times = {m: t for m, t in import_times(f"import {ENTRY_POINT}").items() if m not in baseline}
+    total = times[ENTRY_POINT] / 1000
+    heavy = sorted(m for m in times if m.split(".")[0] in HEAVY_MODULES)
+
+    print(f"import {ENTRY_POINT}: {total:8.3f} ms cumulative")
+    for module, cumulative in sorted(times.items(), key=lambda item: -item[1])[1:6]:
+        print(f"  {module:40} {cumulative / 1000:8.3f} ms")
+
+    if heavy:
+        print(f"heavy modules at startup: {', '.join(heavy)}")
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run([sys.executable, "-m", ENTRY_POINT, "--help"], capture_output=True, check=True)
+    elapsed = (time.perf_counter() - start) / runs
+
+    print(f"tlever --help:  {elapsed * 1000:8.3f} ms per run over {runs} runs")
+
+    if budget is not None and total > budget:
+        print(f"over budget of {budget} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
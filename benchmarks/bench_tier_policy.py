@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+"""
+Time tier classification over a synthetic snapshot, without any RPC
+
+    python benchmarks/bench_tier_policy.py [torrents]
+"""
+
+import sys
+import json
+import time
+import random
+import os.path
+
+from transmission_lever.extra import tier
+from transmission_lever.extra.tier import compile_tiers
+
+CONFIG = os.path.join(os.path.dirname(tier.__file__), "..", "tlever.json")
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    config = json.load(open(CONFIG))
+
+    random.seed(0)
+    ratios = [random.choice([-1.0, random.uniform(0, 60)]) for _ in range(size)]
+
+    start = time.perf_counter()
+    policy = compile_tiers(config)
+    compiled = time.perf_counter()
+    bisected = [policy.classify(ratio) for ratio in ratios]
+    done = time.perf_counter()
+
+    print(f"compile:        {(compiled - start) * 1000:8.3f} ms")
+    print(f"bisect:         {(done - compiled) * 1000:8.3f} ms for {size} torrents")
+
+    if policy._array is not None:
+        start = time.perf_counter()
+        vectorized = policy.classify_many(ratios)
+        done = time.perf_counter()
+        assert vectorized == bisected
+        print(f"searchsorted:   {(done - start) * 1000:8.3f} ms for {size} torrents")
+
+
+if __name__ == '__main__':
+    main()
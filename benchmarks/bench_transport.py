@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+"""
+Count the connections and bytes of the RPC transport against a local
+stand-in daemon, without a real transmission instance
+
+    python benchmarks/bench_transport.py [torrents] [calls]
+
+The stand-in answers session-get and torrent-get, gzip compresses its
+responses when asked to and records every TCP connection it accepts and
+every byte it sends. The same workload, a few get_client + snapshot rounds
+and a burst of threaded torrent-get calls, runs twice: with a new unmodified
+client per round as before, and through the shared pooled client. Both ask
+for gzip, as requests does by default.
+"""
+
+import sys
+import gzip
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from transmission_rpc import Client
+
+from transmission_lever.core import client as transport
+from transmission_lever.core.client import get_client, get_scheduler
+from transmission_lever.core.snapshot import SNAPSHOT_FIELDS, get_snapshot
+
+SESSION_ID = "stand-in"
+
+
+class Stats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.sent = 0
+        self.raw = 0
+
+
+def make_torrents(count: int) -> list[dict]:
+    random.seed(0)
+    return [{
+        "id": i,
+        "hashString": f"{i:040x}",
+        "name": f"Some.Show.S01E{i % 99:02d}.1080p.WEB.x264-GROUP",
+        "uploadRatio": random.uniform(0, 60),
+        "percentDone": 1.0,
+        "status": 6,
+        "labels": ["@shows", f"%tier-{i % 10}"],
+        "downloadDir": "/downloads/shows",
+        "uploadLimit": 500,
+        "uploadLimited": True,
+        "seedIdleLimit": 30,
+        "seedIdleMode": 2,
+        "seedRatioLimit": 5,
+        "seedRatioMode": 1,
+        "totalSize": random.randrange(1 << 30),
+        "bandwidthPriority": 0
+    } for i in range(count)]
+
+
+def make_handler(stats: Stats, torrents: list[dict]):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with stats.lock:
+                stats.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status: int, body: bytes, headers: dict = None):
+            raw = len(body)
+            if status == 200 and "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                headers = dict(headers or {}, **{"Content-Encoding": "gzip"})
+
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("X-Transmission-Session-Id", SESSION_ID)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+            with stats.lock:
+                stats.requests += 1
+                stats.sent += len(body)
+                stats.raw += raw
+
+        def do_POST(self):
+            query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+            if self.headers.get("X-Transmission-Session-Id") != SESSION_ID:
+                return self.reply(409, b"")
+
+            if query["method"] == "session-get":
+                arguments = {"rpc-version": 17, "rpc-version-semver": "5.3.0",
+                             "version": "4.0.0 (stand-in)", "download-dir": "/downloads"}
+            elif query["method"] == "torrent-get":
+                fields = query["arguments"]["fields"]
+                ids = set(query["arguments"].get("ids") or [])
+                arguments = {"torrents": [{f: t[f] for f in fields if f in t} for t in torrents
+                                          if not ids or t["hashString"] in ids]}
+            else:
+                arguments = {}
+
+            body = json.dumps({"arguments": arguments, "result": "success"}).encode()
+            self.reply(200, body, {"Content-Type": "application/json"})
+
+    return Handler
+
+
+def workload(connect, rounds: int, calls: int, config: dict) -> None:
+    for _ in range(rounds):
+        get_snapshot(connect(), ids=None)
+
+    client = connect()
+    hashes = [f"{i:040x}" for i in range(calls)]
+    get_scheduler(config).map(lambda h: client.get_torrents(ids=[h], arguments=SNAPSHOT_FIELDS), hashes)
+
+
+def plain_client(config: dict) -> Client:
+    return Client(host=config["Client"]["host"], port=config["Client"]["port"])
+
+
+def run(name: str, connect, torrents: list[dict], calls: int) -> None:
+    stats = Stats()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(stats, torrents))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    config = {
+        "Client": {"host": "127.0.0.1", "port": server.server_address[1], "username": "", "password": ""},
+        "Scheduler": {"min_concurrency": 8, "max_concurrency": 8}
+    }
+
+    start = time.perf_counter()
+    workload(lambda: connect(config), 5, calls, config)
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+
+    print(f"{name:8} connections={stats.connections:4} requests={stats.requests:4} "
+          f"sent={stats.sent / 1024:9.1f} KiB raw={stats.raw / 1024:9.1f} KiB "
+          f"time={elapsed * 1000:8.1f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    torrents = make_torrents(count)
+
+    run("plain", plain_client, torrents, calls)
+    transport._clients.clear()
+    run("pooled", get_client, torrents, calls)
+
+
+if __name__ == "__main__":
+    main()
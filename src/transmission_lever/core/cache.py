@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import NamedTuple
+from transmission_rpc import Client
+
+# fields that rarely change, everything else is always asked to the daemon
+CACHE_FIELDS = ["id", "hashString", "name", "labels", "downloadDir", "totalSize"]
+
+# transmission reports torrents active in the last 60 seconds as recently-active
+RECENTLY_ACTIVE_WINDOW = 60
+
+
+class CachedTorrent(NamedTuple):
+
+    """
+    This class represents the cached metadata of a torrent
+    """
+
+    id: int
+    hash: str
+    name: str
+    labels: tuple
+    download_dir: str
+    size: int
+
+
+class MetadataCache:
+
+    """
+    This class represents an on-disk cache of slow-changing torrent metadata,
+    kept fresh with recently-active deltas and invalidated on every write
+    """
+
+    def __init__(self,
+                 path: str,
+                 max_age: float = 30):
+
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS torrents (
+                hash TEXT PRIMARY KEY,
+                id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                download_dir TEXT NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS torrents_id ON torrents (id);
+            CREATE TABLE IF NOT EXISTS invalidated (
+                hash TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+    def _meta(self, key: str):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key: str, value) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _upsert(self, torrents: list) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO torrents (hash, id, name, labels, download_dir, size) VALUES (?, ?, ?, ?, ?, ?)",
+            [(t.hashString, t.id, t.name, json.dumps(t.labels), t.download_dir, t.total_size) for t in torrents])
+        self._db.executemany("DELETE FROM invalidated WHERE hash = ?", [(t.hashString,) for t in torrents])
+
+    def age(self) -> float:
+        """
+        Get the seconds since the last refresh
+        :return: age of the cache, infinite if never refreshed
+        """
+
+        refreshed = self._meta("refreshed")
+        return float("inf") if refreshed is None else time.time() - refreshed
+
+    def refresh(self,
+                client: Client,
+                torrent_hashes: list[str] = None
+                ) -> None:
+        """
+        Bring the cache up to date with the cheapest call possible
+        :param client: valid transmission session
+        :param torrent_hashes: only fetch these torrents when the deltas are too old, None to rebuild, empty to skip
+        :return: None
+        """
+
+        with self._lock:
+            age = self.age()
+            now = time.time()
+
+            # nothing will be read, i.e. a command that only invalidates what it writes
+            if age <= self.max_age or (torrent_hashes is not None and not torrent_hashes):
+                return
+
+            # changes older than the window are not reported as deltas
+            if age <= RECENTLY_ACTIVE_WINDOW:
+                active, removed = client.get_recently_active_torrents(arguments=CACHE_FIELDS)
+                self._upsert(active)
+                self._db.executemany("DELETE FROM torrents WHERE id = ?", [(i,) for i in removed])
+                logging.info(f"Cache delta: {len(active)} updated, {len(removed)} removed")
+
+            elif torrent_hashes is not None:
+                # the rest of the cache stays stale, so the refresh time is left alone
+                torrents = client.get_torrents(ids=list(torrent_hashes), arguments=CACHE_FIELDS)
+                gone = [(h.lower(),) for h in torrent_hashes]
+                self._db.executemany("DELETE FROM torrents WHERE hash = ?", gone)
+                self._db.executemany("DELETE FROM invalidated WHERE hash = ?", gone)
+                self._upsert(torrents)
+                self._db.commit()
+                logging.info(f"Cache refreshed {len(torrents)} of {len(torrent_hashes)} torrents")
+                return
+
+            else:
+                torrents = client.get_torrents(arguments=CACHE_FIELDS)
+                self._db.execute("DELETE FROM torrents")
+                self._db.execute("DELETE FROM invalidated")
+                self._upsert(torrents)
+                self._set_meta("download_dir", client.get_session().download_dir)
+                logging.info(f"Cache rebuilt with {len(torrents)} torrents")
+
+            self._set_meta("refreshed", now)
+            self._db.commit()
+
+    def get(self, torrent_hash: str) -> CachedTorrent:
+        """
+        Get the cached metadata of a torrent
+        :param torrent_hash: hash of a single torrent
+        :return: cached metadata, None if not cached
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, hash, name, labels, download_dir, size FROM torrents WHERE hash = ?",
+                (torrent_hash.lower(),)).fetchone()
+
+        if row is None:
+            return None
+        return CachedTorrent(row[0], row[1], row[2], tuple(json.loads(row[3])), row[4], row[5])
+
+    def all(self) -> list[CachedTorrent]:
+        """
+        Get the cached metadata of every torrent
+        :return: list of cached metadata
+        """
+
+        with self._lock:
+            rows = self._db.execute("SELECT id, hash, name, labels, download_dir, size FROM torrents").fetchall()
+
+        return [CachedTorrent(r[0], r[1], r[2], tuple(json.loads(r[3])), r[4], r[5]) for r in rows]
+
+    def download_dir(self) -> str:
+        """
+        Get the cached global download directory
+        :return: global download directory, None if not cached
+        """
+
+        with self._lock:
+            return self._meta("download_dir")
+
+    def invalidate(self, torrent_hash: str) -> None:
+        """
+        Drop a torrent after a write so the next read goes to the daemon
+        :param torrent_hash: hash of a single torrent
+        :return: None
+        """
+
+        with self._lock:
+            self._db.execute("DELETE FROM torrents WHERE hash = ?", (torrent_hash.lower(),))
+            self._db.execute("INSERT OR IGNORE INTO invalidated (hash) VALUES (?)", (torrent_hash.lower(),))
+            self._db.commit()
+
+    def complete(self) -> bool:
+        """
+        Check if every torrent of the session has a row, i.e. no write dropped one since the last refresh
+        :return: True if nothing is pending a refresh, False otherwise
+        """
+
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM invalidated LIMIT 1").fetchone() is None
+
+
+def cache_path(config: dict) -> str:
+    """
+    Get the cache file of an instance
+    :param config: valid configuration dictionary
+    :return: full path of the cache file
+    """
+
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    instance = config["Client"].get("name", "default").replace(os.sep, "_")
+
+    return os.path.join(cache_home, "transmission-lever", f"{instance}.sqlite")
+
+
+def open_cache(config: dict,
+               client: Client,
+               torrent_hashes: list[str] = None
+               ) -> MetadataCache:
+    """
+    Get a refreshed metadata cache if enabled in the optional Cache section
+    :param config: valid configuration dictionary
+    :param client: valid transmission session
+    :param torrent_hashes: torrents a single-torrent command reads, empty if it reads none,
+                           None when the whole cache is needed
+    :return: metadata cache, None if disabled
+    """
+
+    options = config.get("Cache", {})
+    if not options.get("enabled", False):
+        return None
+
+    cache = MetadataCache(cache_path(config), options.get("max_age", 30))
+    cache.refresh(client, torrent_hashes)
+    return cache
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+import os
+import logging
+
+
+def is_empty_dir(path: str) -> bool:
+    """
+    Check if a directory has no entries without listing all of them
+    :param path: directory on the local filesystem
+    :return: True if the directory is empty, False otherwise
+    """
+
+    with os.scandir(path) as entries:
+        return next(entries, None) is None
+
+
+def prune_dirs(directories: set,
+               base_dir: str
+               ) -> int:
+    """
+    Remove vacated directories and their parents while they are empty,
+    never touching base_dir or anything outside of it
+    :param directories: directories left behind by data moves
+    :param base_dir: global download directory
+    :return: number of directories removed
+    """
+
+    base_dir = os.path.normpath(base_dir)
+    removed = 0
+
+    # deepest first, so a parent is checked after its children are gone
+    for directory in sorted({os.path.normpath(d) for d in directories}, key=len, reverse=True):
+        current = directory
+
+        while os.path.commonpath([current, base_dir]) == base_dir and current != base_dir:
+            try:
+                if not is_empty_dir(current):
+                    break
+                os.rmdir(current)
+                removed += 1
+                logging.info(f"Removed empty directory {current}")
+
+            except FileNotFoundError:
+                # already removed through another vacated directory
+                pass
+
+            except OSError as e:
+                logging.warning(f"Skipping cleanup of {current}: {e}")
+                break
+
+            current = os.path.dirname(current)
+
+    return removed
@@ -1,27 +1,269 @@
 #!/usr/bin/env python
 
 import sys
+import time
+import random
 import logging
+import warnings
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
 from transmission_rpc import Client, Torrent
+from transmission_rpc.error import TransmissionAuthError, TransmissionConnectError, TransmissionTimeoutError
+
+# errors that mean the daemon is overloaded or unreachable, not that the call is wrong
+TRANSIENT_ERRORS = (TransmissionConnectError, TransmissionTimeoutError)
+
+# one client per daemon and process, its HTTP session keeps the connections alive
+_clients = {}
+_clients_lock = threading.Lock()
+
+# rpc version of each client, the daemon does not change it while we are connected
+_rpc_versions = {}
+
+
+class RequestScheduler:
+
+    """
+    This class runs RPC calls with a concurrency limit adjusted by AIMD:
+    the limit grows by one slot per round of fast calls and halves when
+    calls get slow or fail, transient failures of idempotent calls are
+    retried with jittered exponential backoff
+    """
+
+    def __init__(self,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = 8,
+                 target_latency: float = 1.0,
+                 retries: int = 3,
+                 backoff: float = 0.5,
+                 max_backoff: float = 8.0):
+
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.limit = float(min_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.retried = 0
+        self.errors = 0
+        self.throttle_events = 0
+
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def _acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def _release(self,
+                 started: float,
+                 latency: float,
+                 failed: bool
+                 ) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self.calls += 1
+
+            if failed or latency > self.target_latency:
+                # only one decrease per window, calls started before the
+                # last decrease were already running under the old limit
+                if started >= self._last_decrease:
+                    old_limit = self.limit
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+                    self._last_decrease = time.monotonic()
+                    self.throttle_events += 1
+                    logging.warning(f"RPC throttled: concurrency {int(old_limit)} -> {int(self.limit)} "
+                                    f"(latency {latency:.2f}s, failed {failed})")
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+            self._cond.notify_all()
+
+    def call(self,
+             func,
+             *args,
+             idempotent: bool = False,
+             **kwargs):
+        """
+        Run a single RPC call under the concurrency limit
+        :param func: callable issuing the RPC call
+        :param idempotent: retry transient failures if True
+        :return: whatever func returns
+        """
+
+        attempt = 0
+        while True:
+            self._acquire()
+            started = time.monotonic()
+
+            try:
+                result = func(*args, **kwargs)
+
+            except TRANSIENT_ERRORS:
+                self._release(started, time.monotonic() - started, True)
+
+                if not idempotent or attempt >= self.retries:
+                    with self._cond:
+                        self.errors += 1
+                    raise
+
+                # full jitter
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                attempt += 1
+                with self._cond:
+                    self.retried += 1
+                logging.info(f"Retrying RPC call in {delay:.2f}s (attempt {attempt}/{self.retries})")
+                time.sleep(delay)
+                continue
+
+            except Exception:
+                self._release(started, time.monotonic() - started, False)
+                with self._cond:
+                    self.errors += 1
+                raise
+
+            self._release(started, time.monotonic() - started, False)
+            return result
+
+    def map(self,
+            func,
+            items,
+            idempotent: bool = False
+            ) -> list:
+        """
+        Run func over every item with as much concurrency as the daemon allows
+        :param func: callable issuing the RPC call for a single item
+        :param items: iterable of arguments for func
+        :param idempotent: retry transient failures if True
+        :return: list of results in the same order as items
+        """
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = [pool.submit(self.call, func, item, idempotent=idempotent) for item in items]
+            return [f.result() for f in futures]
+
+    def stats(self) -> dict:
+        """
+        Get counters of the scheduler
+        :return: dictionary with calls, retries, errors, throttle events and current limit
+        """
+
+        with self._cond:
+            return {
+                "calls": self.calls,
+                "retried": self.retried,
+                "errors": self.errors,
+                "throttle_events": self.throttle_events,
+                "concurrency": int(self.limit)
+            }
+
+
+def get_scheduler(config: dict) -> RequestScheduler:
+    """
+    Get a request scheduler from the optional Scheduler section
+    :param config: valid configuration dictionary
+    :return: request scheduler
+    """
+
+    return RequestScheduler(**config.get("Scheduler", {}))
+
+
+def configure_transport(client: Client,
+                        pool_size: int
+                        ) -> None:
+    """
+    Make the HTTP session of a client keep enough connections alive for concurrent calls
+    :param client: valid transmission session
+    :param pool_size: connections kept alive, at least the scheduler concurrency
+    :return: None
+    """
+
+    # the default adapter already keeps 10 connections, replacing it drops the handshake one
+    if pool_size > DEFAULT_POOLSIZE:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        client._http_session.mount("http://", adapter)
+        client._http_session.mount("https://", adapter)
+
+
+def client_key(config: dict) -> tuple:
+    return (config["Client"].get("protocol", "http"),
+            config["Client"]["host"],
+            int(config["Client"]["port"]),
+            config["Client"].get("path", "/transmission/rpc"),
+            config["Client"]["username"],
+            config["Client"]["password"])
 
 
 def get_client(config: dict) -> Client:
     """
-    Get a transmission RPC client
+    Get a transmission RPC client, shared by every call of the process
+    on the same daemon so its connections are reused
     :param config: valid configuration dictionary
     :return: transmission session
     """
 
+    key = client_key(config)
+
+    with _clients_lock:
+        if key in _clients:
+            return _clients[key]
+
+    scheduler = get_scheduler(config)
+
     try:
-        client = Client(host=config["Client"]["host"],
-                        port=int(config["Client"]["port"]),
-                        username=config["Client"]["username"],
-                        password=config["Client"]["password"])
-        return client
+        # the handshake is a session-get, safe to retry
+        client = scheduler.call(Client,
+                                protocol=key[0],
+                                host=key[1],
+                                port=key[2],
+                                path=key[3],
+                                username=key[4],
+                                password=key[5],
+                                idempotent=True)
 
-    except:
+    except TransmissionAuthError:
         logging.error("Authorization failed")
-        sys.exit()
+        sys.exit(1)
+
+    except Exception as e:
+        logging.error(f"Connection failed: {e}")
+        sys.exit(1)
+
+    configure_transport(client, scheduler.max_concurrency)
+
+    with _clients_lock:
+        # another thread may have connected first, keep a single client
+        return _clients.setdefault(key, client)
+
+
+def get_rpc_version(client: Client) -> int:
+    """
+    Get the RPC version of the daemon without a call, as read by the handshake of the client
+    :param client: valid transmission session
+    :return: version of the RPC protocol
+    """
+
+    with _clients_lock:
+        if client in _rpc_versions:
+            return _rpc_versions[client]
+
+    # the property is deprecated for get_session().rpc_version, a session-get of its own
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        version = getattr(client, "rpc_version", None)
+
+    if version is None:
+        version = client.get_session().rpc_version
+
+    with _clients_lock:
+        return _rpc_versions.setdefault(client, version)
 
 
 def get_rpc_semver(client: Client) -> str:
@@ -54,14 +296,20 @@ def get_downloads_dir(client: Client) -> str:
     return client.get_session().download_dir
 
 
-def get_torrents_list(client: Client) -> list[Torrent]:
+def get_torrents_list(client: Client,
+                      scheduler: RequestScheduler = None
+                      ) -> list[Torrent]:
     """
     List all torrent in the current session
     :param client: valid transmission session
+    :param scheduler: retry the listing through a request scheduler if given
     :return: list of torrent objects
     """
 
-    return client.get_torrents()
+    if scheduler is None:
+        return client.get_torrents()
+
+    return scheduler.call(client.get_torrents, idempotent=True)
 
 
 def start_torrent(client: Client,
@@ -1,23 +1,59 @@
 #!/usr/bin/env python
 
 import os
+import sys
 import json
 import logging
 
 
-def get_config() -> dict:
+def get_config(path: str = None) -> dict:
     """
     Get a config dictionary from a json file
+    :param path: path of the json file, the supported locations are searched if None
     :return: config dictionary
     """
 
-    my_file = __get_file("transmission-lever",
-                         "config.json")
+    my_file = path or __get_file("transmission-lever",
+                                 "config.json")
 
     my_json = open(my_file, 'r')
     return json.load(my_json)
 
 
+def get_instances(config: dict,
+                  instance: str = None
+                  ) -> list[dict]:
+    """
+    Split a config dictionary into one config per transmission instance
+    :param config: valid configuration dictionary
+    :param instance: name of a single instance to select, None selects all
+    :return: list of config dictionaries with a single Client section each
+    """
+
+    clients = config["Client"]
+
+    if isinstance(clients, dict):
+        clients = [clients]
+
+    instances = []
+    for client in clients:
+        name = client.get("name", f"{client['host']}:{client['port']}")
+        instance_config = dict(config)
+        instance_config["Client"] = dict(client, name=name)
+        instances.append(instance_config)
+
+    if instance is None:
+        return instances
+
+    selected = [i for i in instances if i["Client"]["name"] == instance]
+
+    if not selected:
+        logging.error(f"Instance {instance} not found in configuration file")
+        sys.exit(1)
+
+    return selected
+
+
 def __get_file(dirname: str, filename: str) -> str:
     """
     Check if a file exists on the local system
@@ -39,4 +75,4 @@ def __get_file(dirname: str, filename: str) -> str:
 
     else:
         logging.warning("Configuration file not found, using default values")
-        return default
\ No newline at end of file
+        return default
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InstanceResult:
+
+    """
+    This class represents the outcome of a command on a single instance
+    """
+
+    def __init__(self,
+                 name: str,
+                 result: object,
+                 error: BaseException,
+                 elapsed: float):
+
+        self.name = name
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def run_on_instance(instance_config: dict,
+                    func,
+                    *args
+                    ) -> InstanceResult:
+    """
+    Run a command against a single instance and capture its outcome
+    :param instance_config: config dictionary with a single Client section
+    :param func: callable taking the config dictionary as first argument
+    :param args: extra positional arguments for func
+    :return: result of the command on the instance
+    """
+
+    name = instance_config["Client"]["name"]
+    start = time.monotonic()
+
+    try:
+        result = func(instance_config, *args)
+        error = None
+
+    # get_client exits on failure, this must not take the other instances down
+    except (Exception, SystemExit) as e:
+        logging.error(f"Command failed on instance {name}: {e!r}")
+        result, error = None, e
+
+    return InstanceResult(name, result, error, time.monotonic() - start)
+
+
+def run_on_instances(instances: list[dict],
+                     func,
+                     *args,
+                     workers: int = None
+                     ) -> list[InstanceResult]:
+    """
+    Run a command concurrently against several instances
+    :param instances: list of config dictionaries, see config.get_instances
+    :param func: callable taking the config dictionary as first argument
+    :param args: extra positional arguments for func
+    :param workers: maximum number of threads, one per instance if None
+    :return: list of results in the same order as instances
+    """
+
+    if len(instances) == 1:
+        return [run_on_instance(instances[0], func, *args)]
+
+    with ThreadPoolExecutor(max_workers=workers or len(instances)) as pool:
+        futures = [pool.submit(run_on_instance, i, func, *args) for i in instances]
+        return [f.result() for f in futures]
+
+
+def summarize(results: list[InstanceResult]) -> dict:
+    """
+    Aggregate the results of a fan-out run
+    :param results: list of results from run_on_instances
+    :return: dictionary with counters, timings and errors by instance
+    """
+
+    failed = {r.name: repr(r.error) for r in results if not r.ok}
+
+    return {
+        "instances": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "slowest": max((r.elapsed for r in results), default=0.0),
+        "total": sum(r.elapsed for r in results),
+        "errors": failed
+    }
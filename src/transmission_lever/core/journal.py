@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+import os
+import json
+import logging
+import threading
+from transmission_rpc import Client
+
+from transmission_lever.core.client import RequestScheduler
+from transmission_lever.core.plan import Operation, LABELS, THROTTLE, MOVE, START, apply_operations
+from transmission_lever.core.snapshot import get_snapshot, throttle_matches
+
+
+class Journal:
+
+    """
+    This class represents an append-only file of planned and completed writes,
+    one json object per line so a crash loses at most the line being written
+    """
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _write(self, event: str, operation: Operation) -> None:
+        line = {"event": event, "hash": operation.hash, "op": operation.op, "target": encode_target(operation.target)}
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(line, separators=(',', ':')) + '\n')
+            self._file.flush()
+
+    def plan(self, operations: list[Operation]) -> None:
+        """
+        Record writes before any of them is issued
+        :param operations: list of planned writes
+        :return: None
+        """
+
+        for operation in operations:
+            self._write("plan", operation)
+
+    def done(self, operation: Operation) -> None:
+        """
+        Record a write as completed
+        :param operation: completed write
+        :return: None
+        """
+
+        self._write("done", operation)
+
+    def pending(self) -> list[Operation]:
+        """
+        Get the planned writes without a completed record
+        :return: list of planned writes in their original order
+        """
+
+        planned, completed = [], set()
+
+        with open(self.path, 'r') as file:
+            for line in file:
+                # the last line may be cut short by a crash
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                operation = Operation(entry["hash"], entry["op"], decode_target(entry["op"], entry["target"]))
+                if entry["event"] == "plan":
+                    planned.append(operation)
+                else:
+                    completed.add(operation_key(operation))
+
+        pending = {}
+        for operation in planned:
+            key = operation_key(operation)
+            if key not in completed:
+                pending.setdefault(key, operation)
+
+        return list(pending.values())
+
+    def clear(self) -> None:
+        """
+        Remove the journal after a complete run
+        :return: None
+        """
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def encode_target(target):
+    if isinstance(target, tuple):
+        return list(target)
+    if target is not None and not isinstance(target, str):
+        return dict(target)
+    return target
+
+
+def decode_target(op: str,
+                  target):
+    if op == LABELS:
+        return tuple(target)
+    return target
+
+
+def operation_key(operation: Operation) -> tuple:
+    return operation.hash, operation.op, json.dumps(encode_target(operation.target), sort_keys=True)
+
+
+def journal_path(config: dict,
+                 command: str
+                 ) -> str:
+    """
+    Get the journal file of a command on an instance
+    :param config: valid configuration dictionary
+    :param command: name of the bulk command
+    :return: full path of the journal file
+    """
+
+    state_home = os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state")
+    instance = config["Client"].get("name", "default").replace(os.sep, "_")
+
+    return os.path.join(state_home, "transmission-lever", "journal", f"{instance}-{command}.jsonl")
+
+
+def is_satisfied(operation: Operation,
+                 record
+                 ) -> bool:
+    """
+    Check if a write is already reflected on a torrent
+    :param operation: planned write
+    :param record: fresh torrent record, None if the torrent is gone
+    :return: True if the write is not needed anymore, False otherwise
+    """
+
+    if record is None:
+        return True
+
+    if operation.op == LABELS:
+        return record.labels == operation.target
+
+    if operation.op == THROTTLE:
+        return throttle_matches(record, operation.target)
+
+    if operation.op == MOVE:
+        return os.path.normpath(record.download_dir) == os.path.normpath(operation.target)
+
+    if operation.op == START:
+        return record.status != 'stopped'
+
+    return False
+
+
+def verify_pending(client: Client,
+                   journal: Journal,
+                   scheduler: RequestScheduler = None
+                   ) -> list[Operation]:
+    """
+    Get the pending writes of a journal that are still needed
+    :param client: valid transmission session
+    :param journal: journal of an interrupted run
+    :param scheduler: retry the verification fetch through a request scheduler if given
+    :return: list of writes to reapply
+    """
+
+    pending = journal.pending()
+    if not pending:
+        return []
+
+    hashes = list({operation.hash for operation in pending})
+    records = {record.hash: record for record in get_snapshot(client, scheduler, ids=hashes)}
+
+    return [o for o in pending if not is_satisfied(o, records.get(o.hash))]
+
+
+def run_journaled(config: dict,
+                  client: Client,
+                  command: str,
+                  plan,
+                  scheduler: RequestScheduler = None,
+                  resume: bool = False,
+                  grouped: bool = False
+                  ) -> list[Operation]:
+    """
+    Plan and apply the writes of a bulk command through a journal
+    :param config: valid configuration dictionary
+    :param client: valid transmission session
+    :param command: name of the bulk command
+    :param plan: callable returning the list of planned writes
+    :param scheduler: issue the calls concurrently through a request scheduler if given
+    :param resume: reapply the pending writes of an interrupted run instead of planning again
+    :param grouped: issue one multi-id call per group of equal writes
+    :return: list of applied writes
+    """
+
+    journal = Journal(journal_path(config, command))
+
+    if resume and journal.exists():
+        operations = verify_pending(client, journal, scheduler)
+        logging.info(f"Resuming {command}: {len(operations)} writes pending")
+
+    else:
+        if resume:
+            logging.info(f"No interrupted {command} run to resume, planning from scratch")
+
+        # a journal left by a previous crash does not apply to a new plan
+        journal.clear()
+        operations = plan()
+
+    journal.plan(operations)
+    apply_operations(client, operations, scheduler, journal, grouped)
+    journal.clear()
+
+    return operations
@@ -4,20 +4,44 @@ import re
 import logging
 from transmission_rpc import Client
 
+from transmission_lever.core.cache import MetadataCache
+
+
+def get_labels(client: Client,
+               torrent_hash: str,
+               cache: MetadataCache = None
+               ) -> list[str]:
+    """
+    Get the labels of a torrent object
+    :param client: valid transmission session
+    :param torrent_hash: hash of a single torrent
+    :param cache: answer from this metadata cache when the torrent is cached
+    :return: list of labels
+    """
+
+    if cache is not None:
+        cached = cache.get(torrent_hash)
+        if cached is not None:
+            return list(cached.labels)
+
+    return client.get_torrent(torrent_hash, arguments=["labels"]).labels
+
 
 def fd_label(client: Client,
              torrent_hash: str,
              label_name: str,
+             cache: MetadataCache = None
              ) -> bool:
     """
     Find a label on a torrent object
     :param client: valid transmission session
     :param torrent_hash: hash of a single torrent
     :param label_name: name of the label
+    :param cache: answer from this metadata cache when the torrent is cached
     :return: True if the label is found, False otherwise
     """
 
-    torrent_labels = client.get_torrent(torrent_hash).labels
+    torrent_labels = get_labels(client, torrent_hash, cache)
 
     for label in torrent_labels:
         if label == label_name:
@@ -41,7 +65,7 @@ def fd_regex_label(client: Client,
     :return: True if one or more matches are found, False otherwise
     """
 
-    torrent_labels = client.get_torrent(torrent_hash).labels
+    torrent_labels = get_labels(client, torrent_hash)
     labels_flattened_list = ','.join(torrent_labels)
 
     exists = re.search(label_regex, labels_flattened_list)
@@ -51,10 +75,113 @@ def fd_regex_label(client: Client,
     return True
 
 
+class LabelConflict(RuntimeError):
+
+    """
+    This exception is raised when the labels of a torrent changed between
+    the read of a transaction and its commit
+    """
+
+
+class LabelTransaction:
+
+    """
+    This class represents the label edits of a single torrent: the labels are
+    read once, adds, removes and swaps are applied in memory and the final set
+    is written with a single call, only if it changed and nobody else wrote it
+    """
+
+    def __init__(self,
+                 client: Client,
+                 torrent_hash: str,
+                 cache: MetadataCache = None):
+
+        self.client = client
+        self.torrent_hash = torrent_hash
+        self.cache = cache
+        # always from the daemon, a cached row can be older than a write by another tool
+        self.original = list(get_labels(client, torrent_hash))
+        self.labels = list(self.original)
+
+    def __contains__(self, label_name: str) -> bool:
+        return label_name in self.labels
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    @property
+    def changed(self) -> bool:
+        return self.labels != self.original
+
+    def add(self, label_name: str) -> bool:
+        """
+        Add a label
+        :param label_name: name of the label
+        :return: True if the label is added, False if it already exists
+        """
+
+        if label_name in self.labels:
+            return False
+        self.labels.append(label_name)
+        return True
+
+    def remove(self, label_name: str) -> bool:
+        """
+        Remove a label
+        :param label_name: name of the label
+        :return: True if the label is removed, False if it does not exist
+        """
+
+        if label_name not in self.labels:
+            return False
+        self.labels = [label for label in self.labels if label != label_name]
+        return True
+
+    def swap(self, old_label_name: str, new_label_name: str) -> bool:
+        """
+        Replace a label, the new label is added even if the old one does not exist
+        :param old_label_name: name of the label to remove
+        :param new_label_name: name of the label to add
+        :return: True if the old label existed, False otherwise
+        """
+
+        existed = self.remove(old_label_name)
+        self.add(new_label_name)
+        return existed
+
+    def commit(self) -> bool:
+        """
+        Write the final labels if they changed
+        :return: True if written, False if there was nothing to write
+        """
+
+        if not self.changed:
+            return False
+
+        # verify against the daemon right before writing
+        current = get_labels(self.client, self.torrent_hash)
+        if list(current) != self.original:
+            raise LabelConflict(f"Labels of torrent with hash {self.torrent_hash} changed "
+                                f"from {self.original} to {list(current)} since read, aborting")
+
+        self.client.change_torrent(ids=[self.torrent_hash], labels=self.labels)
+        if self.cache is not None:
+            self.cache.invalidate(self.torrent_hash)
+
+        self.original = list(self.labels)
+        return True
+
+
 def sw_label(client: Client,
              torrent_hash: str,
              old_label_name: str,
-             new_label_name: str
+             new_label_name: str,
+             cache: MetadataCache = None
              ) -> bool:
     """
     Swap a label on a torrent object
@@ -62,79 +189,68 @@ def sw_label(client: Client,
     :param torrent_hash: hash of a single torrent
     :param old_label_name: name of the label to remove
     :param new_label_name: name of the label to add
+    :param cache: invalidate the torrent in this metadata cache after the write
     :return: True on swap, False if old label does not exist
     """
 
-    exists = fd_label(client, torrent_hash, old_label_name)
+    with LabelTransaction(client, torrent_hash, cache) as transaction:
+        exists = transaction.swap(old_label_name, new_label_name)
 
     if not exists:
         logging.info(
             f"Skipping label deletion in torrent with hash {torrent_hash}: label {old_label_name} does not exist")
-        mk_label(client, torrent_hash, new_label_name)
         return False
 
-    else:
-        rm_label(client, torrent_hash, old_label_name)
-        mk_label(client, torrent_hash, new_label_name)
-        logging.info(f"Swapped label {old_label_name} with new label {new_label_name} in torrent with hash {torrent_hash}")
-        return True
+    logging.info(f"Swapped label {old_label_name} with new label {new_label_name} in torrent with hash {torrent_hash}")
+    return True
 
 
 def mk_label(client: Client,
              torrent_hash: str,
-             label_name: str
+             label_name: str,
+             cache: MetadataCache = None
              ) -> bool:
     """
     Add a label on a torrent object
     :param client: valid transmission session
     :param torrent_hash: hash of a single torrent
     :param label_name: name of the label
+    :param cache: invalidate the torrent in this metadata cache after the write
     :return: True if the label is created, False if it already exists
     """
 
-    exists = fd_label(client, torrent_hash, label_name)
+    with LabelTransaction(client, torrent_hash, cache) as transaction:
+        created = transaction.add(label_name)
 
-    if not exists:
-        torrent_labels = client.get_torrent(torrent_hash).labels
-        torrent_labels.append(label_name)
-        client.change_torrent(ids=[torrent_hash], labels=torrent_labels)
-        logging.info(f"Added label {label_name} in torrent with hash {torrent_hash}")
-        return True
-
-    else:
+    if not created:
         logging.info(f"Skipping label creation in torrent with hash {torrent_hash}: label {label_name} already exists")
         return False
 
+    logging.info(f"Added label {label_name} in torrent with hash {torrent_hash}")
+    return True
+
 
 def rm_label(client: Client,
              torrent_hash: str,
-             label_name: str
+             label_name: str,
+             cache: MetadataCache = None
              ) -> bool:
     """
     Remove a label from a torrent object
     :param client: valid transmission session
     :param torrent_hash: hash of a single torrent
     :param label_name: name of the label
+    :param cache: invalidate the torrent in this metadata cache after the write
     :return: True if the label is removed, False if it does not exist
     """
 
-    exists = fd_label(client, torrent_hash, label_name)
+    with LabelTransaction(client, torrent_hash, cache) as transaction:
+        removed = transaction.remove(label_name)
 
-    if not exists:
+    if not removed:
         logging.info(
             f"Skipping label deletion in torrent with hash {torrent_hash}: label {label_name}  does not exists")
         return False
 
-    else:
-        torrent_labels = client.get_torrent(torrent_hash).labels
-        torrent_labels_new = []
-
-        for label in torrent_labels:
-            if label == label_name:
-                pass
-            else:
-                torrent_labels_new.append(label)
-
-        client.change_torrent(ids=[torrent_hash], labels=torrent_labels_new)
-        logging.info(f"Removed label {label_name} in torrent with hash {torrent_hash}")
-        return True
+    logging.info(f"Removed label {label_name} in torrent with hash {torrent_hash}")
+    return True
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+import logging
+from typing import NamedTuple
+from transmission_rpc import Client
+
+from transmission_lever.core.client import RequestScheduler, start_torrent
+from transmission_lever.core.torrent import change_upload_throttle
+
+LABELS = "labels"
+THROTTLE = "throttle"
+MOVE = "move"
+START = "start"
+
+
+class Operation(NamedTuple):
+
+    """
+    This class represents a single write planned on a torrent,
+    the target is a labels tuple, a limits mapping, a directory or None
+    """
+
+    hash: str
+    op: str
+    target: object
+
+
+def apply_operation(client: Client,
+                    operation: Operation
+                    ) -> None:
+    """
+    Issue the RPC call of a planned write
+    :param client: valid transmission session
+    :param operation: planned write
+    :return: None
+    """
+
+    if operation.op == LABELS:
+        client.change_torrent(ids=[operation.hash], labels=list(operation.target))
+
+    elif operation.op == THROTTLE:
+        change_upload_throttle(client, operation.hash, operation.target)
+
+    elif operation.op == MOVE:
+        client.move_torrent_data(ids=[operation.hash], location=operation.target)
+
+    elif operation.op == START:
+        start_torrent(client, operation.hash)
+
+    else:
+        raise ValueError(f"Unknown operation {operation.op}")
+
+    logging.info(f"Applied {operation.op} {operation.target} on torrent with hash {operation.hash}")
+
+
+def group_operations(operations: list[Operation]) -> list[list[Operation]]:
+    """
+    Bucket planned writes that only differ in their torrent
+    :param operations: list of planned writes
+    :return: list of groups, each one can be issued as a single multi-id call
+    """
+
+    groups = {}
+    for operation in operations:
+        target = operation.target
+        if target is not None and not isinstance(target, (str, tuple)):
+            target = tuple(sorted(target.items()))
+        groups.setdefault((operation.op, target), []).append(operation)
+
+    return list(groups.values())
+
+
+def apply_group(client: Client,
+                group: list[Operation]
+                ) -> None:
+    """
+    Issue a single multi-id RPC call for a group of equal writes
+    :param client: valid transmission session
+    :param group: list of planned writes sharing kind and target
+    :return: None
+    """
+
+    ids = [operation.hash for operation in group]
+    operation = group[0]
+
+    if operation.op == LABELS:
+        client.change_torrent(ids=ids, labels=list(operation.target))
+
+    elif operation.op == THROTTLE:
+        change_upload_throttle(client, ids, operation.target)
+
+    elif operation.op == MOVE:
+        client.move_torrent_data(ids=ids, location=operation.target)
+
+    elif operation.op == START:
+        client.start_torrent(ids=ids)
+
+    else:
+        raise ValueError(f"Unknown operation {operation.op}")
+
+    logging.info(f"Applied {operation.op} {operation.target} on {len(ids)} torrents")
+
+
+def apply_operations(client: Client,
+                     operations: list[Operation],
+                     scheduler: RequestScheduler = None,
+                     journal=None,
+                     grouped: bool = False
+                     ) -> int:
+    """
+    Issue the RPC calls of a list of planned writes
+    :param client: valid transmission session
+    :param operations: list of planned writes
+    :param scheduler: issue the calls concurrently through a request scheduler if given, moves stay sequential
+    :param journal: record every completed write in this journal if given
+    :param grouped: issue one multi-id call per group of equal writes
+    :return: number of RPC calls issued
+    """
+
+    def apply(group: list[Operation]) -> None:
+        if len(group) == 1:
+            apply_operation(client, group[0])
+        else:
+            apply_group(client, group)
+        if journal is not None:
+            for operation in group:
+                journal.done(operation)
+
+    if grouped:
+        groups = group_operations(operations)
+    else:
+        groups = [[operation] for operation in operations]
+
+    if scheduler is None:
+        for group in groups:
+            apply(group)
+
+    else:
+        # moves are bound by disk and go one at a time, torrents start once their labels are written
+        for group in (g for g in groups if g[0].op == MOVE):
+            apply(group)
+        scheduler.map(apply, [g for g in groups if g[0].op not in (MOVE, START)])
+        scheduler.map(apply, [g for g in groups if g[0].op == START])
+
+    return len(groups)
+
+
+def count_operations(operations: list[Operation]) -> dict:
+    """
+    Count planned writes by kind
+    :param operations: list of planned writes
+    :return: dictionary of counters by operation kind
+    """
+
+    counters = {}
+    for operation in operations:
+        counters[operation.op] = counters.get(operation.op, 0) + 1
+    return counters
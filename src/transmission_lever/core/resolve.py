@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+import re
+import string
+from bisect import bisect_left
+from fnmatch import fnmatchcase
+from transmission_rpc import Client
+
+from transmission_lever.core.cache import MetadataCache, open_cache
+from transmission_lever.core.client import get_client
+from transmission_lever.core.fanout import run_on_instances
+
+RESOLVE_FIELDS = ["id", "hashString", "name"]
+
+HEX_CHARS = frozenset(string.hexdigits.lower())
+
+# shorter hex strings are too likely to collide, they are only tried as ids and names
+MIN_PREFIX = 4
+
+
+class TargetError(ValueError):
+
+    """
+    This exception is raised when a CLI target matches no torrent or more than one
+    """
+
+
+class TargetNotFound(TargetError):
+
+    """
+    This exception is raised when a CLI target matches no torrent
+    """
+
+
+def name_tokens(name: str) -> set[str]:
+    """
+    Split a torrent name into lowercase words
+    :param name: name of the torrent
+    :return: set of words
+    """
+
+    return set(re.findall(r"[a-z0-9]+", name.lower()))
+
+
+class TorrentIndex:
+
+    """
+    This class represents a lookup index over the torrents of a session:
+    a sorted hash array for prefixes, an id table and a name token index
+    """
+
+    def __init__(self, entries: list[tuple[int, str, str]]):
+
+        self.hashes = sorted(entry[1].lower() for entry in entries)
+        self.ids = {entry[0]: entry[1].lower() for entry in entries}
+        self.names = {entry[1].lower(): entry[2] for entry in entries}
+        self.tokens = {}
+
+        for _, torrent_hash, name in entries:
+            for token in name_tokens(name):
+                self.tokens.setdefault(token, set()).add(torrent_hash.lower())
+
+    def by_prefix(self, prefix: str) -> list[str]:
+        """
+        Find the hashes starting with a prefix
+        :param prefix: lowercase hex prefix
+        :return: list of matching hashes
+        """
+
+        matches = []
+        i = bisect_left(self.hashes, prefix)
+        while i < len(self.hashes) and self.hashes[i].startswith(prefix):
+            matches.append(self.hashes[i])
+            i += 1
+        return matches
+
+    def by_name(self, pattern: str) -> list[str]:
+        """
+        Find the hashes whose name matches a glob pattern or contains all its words
+        :param pattern: glob pattern or words of the name
+        :return: list of matching hashes
+        """
+
+        if any(char in pattern for char in "*?["):
+            pattern = pattern.lower()
+            return [h for h, name in self.names.items() if fnmatchcase(name.lower(), pattern)]
+
+        tokens = name_tokens(pattern)
+        if not tokens:
+            return []
+
+        # rarest word first, the common ones only filter a few candidates
+        found = sorted((self.tokens.get(token, set()) for token in tokens), key=len)
+        rarest, others = found[0], found[1:]
+        return sorted(h for h in rarest if all(h in other for other in others))
+
+    def resolve(self, target: str) -> str:
+        """
+        Resolve a CLI target to a single hash
+        :param target: hash prefix, numeric id or name pattern
+        :return: hash of the torrent
+        """
+
+        # an exact id wins, digits are only tried as a prefix when no torrent has that id
+        if target.isdigit() and int(target) in self.ids:
+            return self.ids[int(target)]
+
+        target_lower = target.lower()
+        matches = []
+
+        if len(target) >= MIN_PREFIX and set(target_lower) <= HEX_CHARS:
+            matches = self.by_prefix(target_lower)
+
+        if not matches:
+            matches = self.by_name(target)
+
+        if not matches:
+            raise TargetNotFound(f"No torrent matches {target}")
+
+        if len(matches) > 1:
+            candidates = "\n".join(f"  {h} {self.names[h]}" for h in matches[:10])
+            more = f"\n  ... {len(matches) - 10} more" if len(matches) > 10 else ""
+            raise TargetError(f"Target {target} is ambiguous, {len(matches)} torrents match:\n{candidates}{more}")
+
+        return matches[0]
+
+
+def build_index(client: Client,
+                cache: MetadataCache = None
+                ) -> TorrentIndex:
+    """
+    Build the lookup index from the metadata cache or a single field-limited fetch
+    :param client: valid transmission session
+    :param cache: metadata cache, None to ask the daemon
+    :return: lookup index
+    """
+
+    if cache is not None:
+        return TorrentIndex([(t.id, t.hash, t.name) for t in cache.all()])
+
+    torrents = client.get_torrents(arguments=RESOLVE_FIELDS)
+    return TorrentIndex([(t.id, t.hashString, t.name) for t in torrents])
+
+
+def is_full_hash(target: str) -> bool:
+    """
+    Check if a target is already a full info-hash
+    :param target: CLI target
+    :return: True for 40 hex characters, False otherwise
+    """
+
+    return len(target) == 40 and set(target.lower()) <= HEX_CHARS
+
+
+def resolve_target(client: Client,
+                   target: str,
+                   cache: MetadataCache = None
+                   ) -> str:
+    """
+    Resolve a hash prefix, numeric id or name pattern to a full hash
+    :param client: valid transmission session
+    :param target: CLI target
+    :param cache: build the index from this metadata cache if given
+    :return: hash of the torrent
+    """
+
+    if is_full_hash(target):
+        return target.lower()
+
+    # written torrents are dropped from the cache until the next refresh,
+    # an index without them could resolve a prefix they share to another torrent
+    if cache is not None and cache.complete():
+        try:
+            return build_index(client, cache).resolve(target)
+        except TargetError:
+            # added since the last refresh
+            pass
+
+    return build_index(client).resolve(target)
+
+
+def find_targets(config: dict,
+                 targets: list[str]
+                 ) -> list[str]:
+    """
+    Resolve targets on an instance that may not hold them
+    :param config: config dictionary with a single Client section
+    :param targets: CLI targets
+    :return: list with the hash of each target, None where no torrent of the instance matches
+    """
+
+    client = get_client(config)
+    cache = open_cache(config, client)
+    found = []
+
+    for target in targets:
+        if is_full_hash(target):
+            torrents = client.get_torrents(ids=[target.lower()], arguments=["hashString"])
+            found.append(target.lower() if torrents else None)
+            continue
+
+        try:
+            found.append(resolve_target(client, target, cache))
+        except TargetNotFound:
+            found.append(None)
+
+    return found
+
+
+def locate_targets(instances: list[dict],
+                   targets: list[str],
+                   workers: int = None
+                   ) -> dict[str, list[str]]:
+    """
+    Find the single instance holding each target, so targeted commands only run there
+    :param instances: list of config dictionaries, see config.get_instances
+    :param targets: CLI targets
+    :param workers: maximum number of instances searched at the same time
+    :return: dictionary of instance names to the hashes of the targets they hold
+    """
+
+    results = run_on_instances(instances, find_targets, targets, workers=workers)
+    located = {}
+
+    for i, target in enumerate(targets):
+        holders = [(r.name, r.result[i]) for r in results if r.ok and r.result[i] is not None]
+
+        if not holders:
+            unreachable = [r.name for r in results if not r.ok]
+            searched = f", {', '.join(unreachable)} could not be searched" if unreachable else ""
+            raise TargetNotFound(f"No instance holds a torrent matching {target}{searched}")
+
+        if len(holders) > 1:
+            raise TargetError(f"Target {target} is ambiguous, it matches on instances "
+                              f"{', '.join(name for name, _ in holders)}")
+
+        name, torrent_hash = holders[0]
+        located.setdefault(name, []).append(torrent_hash)
+
+    return located
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+from typing import NamedTuple
+from transmission_rpc import Client
+from transmission_rpc.torrent import get_status
+
+from transmission_lever.core.client import RequestScheduler
+
+# fields needed by the bulk policies, everything else is left on the daemon
+SNAPSHOT_FIELDS = [
+    "id",
+    "hashString",
+    "name",
+    "uploadRatio",
+    "percentDone",
+    "status",
+    "labels",
+    "downloadDir",
+    "uploadLimit",
+    "uploadLimited",
+    "seedIdleLimit",
+    "seedIdleMode",
+    "seedRatioLimit",
+    "seedRatioMode",
+    "totalSize",
+    "bandwidthPriority"
+]
+
+
+class TorrentRecord(NamedTuple):
+
+    """
+    This class represents the fields of a torrent used by the bulk policies
+    """
+
+    id: int
+    hash: str
+    name: str
+    ratio: float
+    progress: float
+    status: str
+    labels: tuple
+    download_dir: str
+    upload_limit: int
+    upload_limited: bool
+    seed_idle_limit: int
+    seed_idle_mode: int
+    seed_ratio_limit: float
+    seed_ratio_mode: int
+    size: int
+    priority: int = 0
+
+
+def to_record(fields: dict) -> TorrentRecord:
+    """
+    Build a record from the raw fields of a torrent-get response
+    :param fields: dictionary of raw torrent fields
+    :return: torrent record
+    """
+
+    return TorrentRecord(
+        id=fields["id"],
+        hash=fields["hashString"],
+        name=fields["name"],
+        ratio=float(fields["uploadRatio"]),
+        progress=round(100.0 * fields["percentDone"], 2),
+        status=get_status(fields["status"]),
+        labels=tuple(fields["labels"]),
+        download_dir=fields["downloadDir"],
+        upload_limit=fields["uploadLimit"],
+        upload_limited=fields["uploadLimited"],
+        seed_idle_limit=fields["seedIdleLimit"],
+        seed_idle_mode=fields["seedIdleMode"],
+        seed_ratio_limit=float(fields["seedRatioLimit"]),
+        seed_ratio_mode=fields["seedRatioMode"],
+        size=fields["totalSize"],
+        priority=fields.get("bandwidthPriority", 0)
+    )
+
+
+def get_snapshot(client: Client,
+                 scheduler: RequestScheduler = None,
+                 ids: list = None
+                 ) -> list[TorrentRecord]:
+    """
+    List torrents in the current session with a single field-limited call
+    :param client: valid transmission session
+    :param scheduler: retry the listing through a request scheduler if given
+    :param ids: hashes or ids of the torrents to list, all torrents if None
+    :return: list of torrent records
+    """
+
+    if scheduler is None:
+        torrents = client.get_torrents(ids=ids, arguments=SNAPSHOT_FIELDS)
+    else:
+        torrents = scheduler.call(client.get_torrents, ids=ids, arguments=SNAPSHOT_FIELDS, idempotent=True)
+
+    return [to_record(torrent.fields) for torrent in torrents]
+
+
+def throttle_matches(record: TorrentRecord,
+                     limits: dict
+                     ) -> bool:
+    """
+    Check if a torrent already has the given upload limits
+    :param record: torrent record
+    :param limits: dictionary with upload limits
+    :return: True if no throttle write is needed, False otherwise
+    """
+
+    return (record.upload_limit == limits["upload_limit"]
+            and record.upload_limited == limits["upload_limited"]
+            and record.seed_idle_limit == limits["seed_idle_limit"]
+            and record.seed_idle_mode == limits["seed_idle_mode"]
+            and record.seed_ratio_limit == float(limits["seed_ratio_limit"])
+            and record.seed_ratio_mode == limits["seed_ratio_mode"]
+            and record.priority == limits.get("bandwidth_priority", record.priority))
+
+
+def ratio_column(records: list[TorrentRecord]) -> list[float]:
+    """
+    Get the ratio of every record in a snapshot
+    :param records: list of torrent records
+    :return: list of ratios in the same order
+    """
+
+    return [record.ratio for record in records]
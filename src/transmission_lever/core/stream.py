@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+import json
+import codecs
+import logging
+from typing import Iterator
+import requests
+from transmission_rpc import Client
+from transmission_rpc.error import TransmissionAuthError, TransmissionConnectError, TransmissionError, \
+    TransmissionTimeoutError
+
+from transmission_lever.core.client import RequestScheduler, get_rpc_version
+from transmission_lever.core.snapshot import SNAPSHOT_FIELDS, TorrentRecord, to_record
+
+CHUNK_SIZE = 64 * 1024
+
+
+def transport_error(error: requests.exceptions.RequestException) -> TransmissionError:
+    """
+    Translate a requests failure into the error transmission_rpc raises for it
+    :param error: exception raised by the HTTP session
+    :return: transmission error, transient for timeouts and lost connections
+    """
+
+    if isinstance(error, requests.exceptions.Timeout):
+        return TransmissionTimeoutError("timeout when connection to transmission daemon")
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        return TransmissionConnectError(f"can't connect to transmission daemon: {error!s}")
+    return TransmissionError(f"Query failed: {error!s}")
+
+
+def open_stream(client: Client,
+                query: dict
+                ) -> requests.Response:
+    """
+    Post a RPC query and return the response once its headers arrived
+    :param client: valid transmission session
+    :param query: json-rpc query
+    :return: streamed response, the body is not read yet
+    """
+
+    for attempt in range(2):
+        try:
+            response = client._http_session.post(client._url,
+                                                 json=query,
+                                                 headers=client._http_header,
+                                                 timeout=client.timeout,
+                                                 stream=True)
+        except requests.exceptions.RequestException as e:
+            raise transport_error(e) from e
+
+        if response.status_code in {401, 403}:
+            response.close()
+            raise TransmissionAuthError("transmission daemon require auth", original=response)
+
+        # the session id expired, a session-get through the client renews it
+        if response.status_code == 409 and attempt == 0:
+            response.close()
+            client.get_session()
+            continue
+
+        break
+
+    return response
+
+
+def iter_chunks(client: Client,
+                query: dict,
+                scheduler: RequestScheduler = None
+                ) -> Iterator[str]:
+    """
+    Post a RPC query and yield the decoded response text as it arrives
+    :param client: valid transmission session
+    :param query: json-rpc query
+    :param scheduler: retry the query until the first byte through this scheduler, a default one if None
+    :return: generator of text chunks
+    """
+
+    # a read-only query, safe to post again as long as nothing was yielded
+    scheduler = scheduler or RequestScheduler()
+    response = scheduler.call(open_stream, client, query, idempotent=True)
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with response:
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                yield decoder.decode(chunk)
+        except requests.exceptions.RequestException as e:
+            raise transport_error(e) from e
+        yield decoder.decode(b'', final=True)
+
+
+def iter_torrent_fields(client: Client,
+                        fields: list[str] = None,
+                        scheduler: RequestScheduler = None
+                        ) -> Iterator[dict]:
+    """
+    Decode a torrent-get response incrementally, one torrent at a time
+    :param client: valid transmission session
+    :param fields: fields to request, defaults to the snapshot fields
+    :param scheduler: run the calls through this scheduler, a default one if None
+    :return: generator of raw torrent field dictionaries
+    """
+
+    fields = fields or SNAPSHOT_FIELDS
+    arguments = {"fields": fields}
+    scheduler = scheduler or RequestScheduler()
+
+    # the table format sends every field name once instead of once per torrent
+    if get_rpc_version(client) >= 16:
+        arguments["format"] = "table"
+
+    chunks = iter_chunks(client, {"method": "torrent-get", "arguments": arguments}, scheduler)
+    decoder = json.JSONDecoder()
+    buffer, pos, header = '', 0, None
+
+    def more() -> bool:
+        nonlocal buffer, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        # drop what was already decoded so the buffer stays small
+        buffer, pos = buffer[pos:] + chunk, 0
+        return True
+
+    # seek the start of the torrents array
+    while True:
+        start = buffer.find('"torrents"', pos)
+        if start != -1:
+            bracket = buffer.find('[', start)
+            if bracket != -1:
+                pos = bracket + 1
+                break
+        if not more():
+            raise TransmissionError("Query failed, no torrents in response", raw_response=buffer)
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+
+        if pos >= len(buffer):
+            if not more():
+                raise TransmissionError("Query failed, truncated torrents in response")
+            continue
+
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if not more():
+                raise TransmissionError("Query failed, truncated torrents in response") from e
+            continue
+
+        pos = end
+
+        if isinstance(item, dict):
+            yield item
+        elif header is None:
+            header = item
+        else:
+            yield dict(zip(header, item))
+
+
+def iter_records(client: Client,
+                 scheduler: RequestScheduler = None
+                 ) -> Iterator[TorrentRecord]:
+    """
+    List all torrents in the current session as a stream of records,
+    memory stays bounded by one chunk of the response regardless of the session size
+    :param client: valid transmission session
+    :param scheduler: run the calls through this scheduler, a default one if None
+    :return: generator of torrent records
+    """
+
+    count = 0
+    for fields in iter_torrent_fields(client, scheduler=scheduler):
+        count += 1
+        yield to_record(fields)
+
+    logging.info(f"Streamed {count} torrents")
@@ -4,6 +4,8 @@ import os
 import logging
 from transmission_rpc import Client, Torrent
 
+from transmission_lever.core.cache import MetadataCache
+
 
 class TorrentStub:
 
@@ -59,7 +61,9 @@ class TorrentStub:
 
 def mv_data(client: Client,
             torrent_hash: str,
-            directory: str
+            directory: str,
+            vacated: set = None,
+            cache: MetadataCache = None
             ) -> None:
 
     """
@@ -67,12 +71,28 @@ def mv_data(client: Client,
     :param client: valid transmission session
     :param torrent_hash: hash of a single torrent
     :param directory: directory where to move the data
+    :param vacated: collect the directory the data is moved out of if given
+    :param cache: answer the old directory from this metadata cache when the torrent is cached
     :return: None
     """
 
-    old_directory = client.get_torrent(torrent_id=torrent_hash).download_dir
-    logging.info(f"Moving data from {old_directory} to {directory} for torrent with hash {torrent_hash}")
+    cached = cache.get(torrent_hash) if cache is not None else None
+    old_directory = cached.download_dir if cached is not None else None
+
+    # the old directory is only asked to the daemon when the cleanup needs it
+    if old_directory is None and vacated is not None:
+        old_directory = client.get_torrent(torrent_id=torrent_hash, arguments=["downloadDir"]).download_dir
+
+    logging.info(f"Moving data from {old_directory or 'its directory'} to {directory} "
+                 f"for torrent with hash {torrent_hash}")
     client.move_torrent_data(ids=[torrent_hash], location=directory)
+
+    if cache is not None:
+        cache.invalidate(torrent_hash)
+
+    if vacated is not None and os.path.normpath(old_directory) != os.path.normpath(directory):
+        vacated.add(old_directory)
+
     return None
 
 
@@ -243,22 +263,25 @@ def get_rel_download_dir(client: Client,
 
 
 def change_upload_throttle(client,
-                           torrent_hash: str,
+                           torrent_hash: str | list[str],
                            limits: dict
                            ) -> None:
 
     """
     Change upload throttle of a torrent
     :param client: valid transmission session
-    :param torrent_hash: hash of a single torrent
-    :param limits: dictionary with upload limits
+    :param torrent_hash: hash of a single torrent, or a list of hashes sharing the limits
+    :param limits: dictionary with upload limits, bandwidth_priority is optional
     :return:
     """
 
-    client.change_torrent(ids=[torrent_hash],
+    ids = torrent_hash if isinstance(torrent_hash, list) else [torrent_hash]
+
+    client.change_torrent(ids=ids,
                           seed_idle_limit=limits['seed_idle_limit'],
                           seed_idle_mode=limits["seed_idle_mode"],
                           seed_ratio_mode=limits["seed_ratio_mode"],
                           seed_ratio_limit=limits["seed_ratio_limit"],
                           upload_limit=limits["upload_limit"],
-                          upload_limited=limits["upload_limited"])
+                          upload_limited=limits["upload_limited"],
+                          bandwidth_priority=limits.get("bandwidth_priority"))
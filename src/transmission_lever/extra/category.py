@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 
 import os
+from transmission_rpc import Client
 
-from transmission_lever.core.label import mk_label, rm_label, fd_regex_label
-from transmission_lever.core.torrent import mv_data, get_rel_download_dir
-from transmission_lever.core.client import get_downloads_dir, get_client, get_torrents_list
+from transmission_lever.core.cache import MetadataCache, open_cache
+from transmission_lever.core.cleanup import prune_dirs
+from transmission_lever.core.label import mk_label, rm_label
+from transmission_lever.core.torrent import mv_data
+from transmission_lever.core.client import get_downloads_dir, get_client, get_scheduler
+from transmission_lever.core.journal import run_journaled
+from transmission_lever.core.plan import Operation, MOVE, group_operations
+from transmission_lever.core.stream import iter_records
+from transmission_lever.extra.verify import verify_torrents
 
 
 def category_prefix(config) -> str:
@@ -18,51 +25,141 @@ def category_prefix(config) -> str:
     return config['General']['prefix']['categories']
 
 
-def enforce_categories(config: dict) -> None:
+def base_download_dir(client: Client,
+                      cache: MetadataCache = None
+                      ) -> str:
 
     """
-    Syncs torrent data dir with category label
+    Get the global download directory, from the metadata cache when enabled
+    :param client: valid transmission session
+    :param cache: metadata cache, None to ask the daemon
+    :return: global download directory
+    """
+
+    if cache is not None and cache.download_dir() is not None:
+        return cache.download_dir()
+
+    return get_downloads_dir(client)
+
+
+def category_dir(base_dir: str,
+                 category_name: str
+                 ) -> str:
+
+    """
+    Get the directory of a category
+    :param base_dir: global download directory
+    :param category_name: name of the category
+    :return: directory of the category
+    """
+
+    return os.path.normpath(os.path.join(base_dir, category_name))
+
+
+def plan_categories(config: dict,
+                    records,
+                    base_dir: str
+                    ) -> list[Operation]:
+
+    """
+    Plan the moves that sync torrent data dir with category label
     :param config: valid configuration dictionary
+    :param records: iterable of torrent records
+    :param base_dir: global download directory
+    :return: list of planned writes
+    """
+
+    prefix = category_prefix(config)
+    operations = []
+
+    for record in records:
+
+        # The last category label wins, as it did when moving once per label
+        categories = [label[len(prefix):] for label in record.labels if label.startswith(prefix)]
+        if not categories:
+            continue
+
+        final_dir = category_dir(base_dir, categories[-1])
+        if os.path.normpath(record.download_dir) != final_dir:
+            operations.append(Operation(record.hash, MOVE, final_dir))
+
+    return operations
+
+
+def print_moves(operations: list[Operation],
+                sizes: dict[str, int]
+                ) -> None:
+
+    """
+    Print the planned moves, one line per destination
+    :param operations: list of planned moves
+    :param sizes: dictionary of hashes to data size in bytes
     :return: None
     """
 
-    client = get_client(config)
+    groups = group_operations(operations)
+    print(f"{len(operations)} torrents to move in {len(groups)} calls")
 
-    # For every torrent in the torrent list
-    for torrent in get_torrents_list(client):
+    for group in sorted(groups, key=lambda g: g[0].target):
+        size = sum(sizes.get(operation.hash, 0) for operation in group)
+        print(f"  {group[0].target}: {len(group)} torrents, {size / 2 ** 30:.2f} GiB")
 
-        # We get the torrent relative download directory
-        rel_torrent_dir = get_rel_download_dir(client, torrent)
-        # We check that there is a category label
-        label_exists = fd_regex_label(client, torrent.hashString, "@")
 
-        # If the category label exists
-        if label_exists:
+def enforce_categories(config: dict,
+                       resume: bool = False,
+                       cleanup: bool = False,
+                       verify: bool = False,
+                       dry_run: bool = False
+                       ) -> None:
 
-            # We grab all the torrent labels
-            torrent_labels = torrent.labels
+    """
+    Syncs torrent data dir with category label
+    :param config: valid configuration dictionary
+    :param resume: reapply only the pending moves of an interrupted run
+    :param cleanup: remove the local directories left empty by the moves
+    :param verify: recheck the moved data, a few torrents at a time
+    :param dry_run: only print the moves, one line per destination
+    :return: None
+    """
+
+    client = get_client(config)
+    scheduler = get_scheduler(config)
+    base_dir = get_downloads_dir(client)
+    sources = {}
+    sizes = {}
 
-            # For every torrent label
-            for label in torrent_labels:
+    def plan() -> list[Operation]:
+        operations = []
 
-                # We check for @ as the first char
-                if label[0] == '@':
+        # only the sources of moved torrents are kept while streaming
+        for record in iter_records(client, scheduler):
+            for operation in plan_categories(config, (record,), base_dir):
+                sources[operation.hash] = record.download_dir
+                sizes[operation.hash] = record.size
+                operations.append(operation)
 
-                    # We get the label relative directory
-                    rel_label_dir = label.replace('@', '')
+        return operations
 
-                    # If label rel dir does not equals torrent rel dir
-                    if rel_torrent_dir != rel_label_dir:
+    if dry_run:
+        print_moves(plan(), sizes)
+        return
 
-                        # We enforce the category label directory
-                        base_dir = get_downloads_dir(client)
-                        final_dir = os.path.join(base_dir, rel_label_dir)
-                        mv_data(client, torrent.hashString, final_dir)
+    # one set-location per destination, sequential as moves are bound by disk and not by the RPC
+    operations = run_journaled(config, client, "category-enforce", plan, resume=resume, grouped=True)
+
+    # sources are only known when this run planned the moves
+    if cleanup:
+        vacated = {sources[o.hash] for o in operations if o.hash in sources}
+        prune_dirs(vacated, base_dir)
+
+    if verify:
+        verify_torrents(config, client, [operation.hash for operation in operations])
 
 
 def mk_category(config: dict,
                 torrent_hash: str,
-                category_name: str
+                category_name: str,
+                cleanup: bool = False
                 ) -> None:
 
     """
@@ -70,23 +167,31 @@ def mk_category(config: dict,
     :param config: valid configuration dictionary
     :param torrent_hash: hash of a single torrent
     :param category_name: name of the category
+    :param cleanup: remove the local directory left empty by the move
     :return: None
     """
 
     client = get_client(config)
+    cache = open_cache(config, client, [torrent_hash])
+    vacated = set() if cleanup else None
 
     label = category_prefix(config) + category_name
-    mk_label(client, torrent_hash, label)
+    mk_label(client, torrent_hash, label, cache)
 
-    directory = os.path.join(get_downloads_dir(client), category_name)
-    mv_data(client, torrent_hash, directory)
+    base_dir = base_download_dir(client, cache)
+    directory = os.path.join(base_dir, category_name)
+    mv_data(client, torrent_hash, directory, vacated, cache)
+
+    if cleanup:
+        prune_dirs(vacated, base_dir)
 
     return
 
 
 def rm_category(config: dict,
                 torrent_hash: str,
-                category_name: str
+                category_name: str,
+                cleanup: bool = False
                 ) -> None:
 
     """
@@ -94,15 +199,21 @@ def rm_category(config: dict,
     :param config: valid configuration dictionary
     :param torrent_hash: hash of a single torrent
     :param category_name: name of the category
+    :param cleanup: remove the local directory left empty by the move
     :return: None
     """
 
     client = get_client(config)
+    cache = open_cache(config, client, [torrent_hash])
+    vacated = set() if cleanup else None
+
+    directory = base_download_dir(client, cache)
+    mv_data(client, torrent_hash, directory, vacated, cache)
 
-    directory = get_downloads_dir(client)
-    mv_data(client, torrent_hash, directory)
+    if cleanup:
+        prune_dirs(vacated, directory)
 
     label = category_prefix(config) + category_name
-    rm_label(client, torrent_hash, label)
+    rm_label(client, torrent_hash, label, cache)
 
     return
@@ -1,54 +1,109 @@
 #!/usr/bin/env python
 
-from transmission_lever.core.client import get_client, get_torrents_list
-from transmission_lever.core.torrent import change_upload_throttle
+import logging
+from types import MappingProxyType
 
+from transmission_lever.core.client import get_client, get_scheduler
+from transmission_lever.core.journal import run_journaled
+from transmission_lever.core.plan import Operation, THROTTLE
+from transmission_lever.core.snapshot import TorrentRecord, throttle_matches
+from transmission_lever.core.stream import iter_records
 
-def set_clog(config: dict) -> None:
+CLOG_LIMITS = MappingProxyType({
+    "seed_idle_limit": 30,
+    "seed_idle_mode": 2,
+    "seed_ratio_limit": 5,
+    "seed_ratio_mode": 2,
+    "upload_limit": 50,
+    "upload_limited": True
+})
+
+HARD_CLOG_LIMITS = MappingProxyType(dict(CLOG_LIMITS, upload_limit=25))
+
+UNCLOG_LIMITS = MappingProxyType(dict(CLOG_LIMITS, upload_limited=False))
+
+
+def clog_limits(record: TorrentRecord) -> MappingProxyType:
+    """
+    Get the throttle of a torrent above last tier
+    :param record: torrent record
+    :return: clog limits, None if the torrent is not clogged
+    """
+
+    # Check if torrent is complete
+    if record.progress != 100:
+        return None
+
+    elif 50 < record.ratio < 70:
+        return CLOG_LIMITS
+
+    elif 70 < record.ratio:
+        return HARD_CLOG_LIMITS
+
+    return None
+
+
+def plan_set_clog(records) -> list[Operation]:
+    """
+    Plan the writes that clog torrents above last tier
+    :param records: iterable of torrent records
+    :return: list of planned writes
+    """
+
+    operations = []
+
+    for record in records:
+        limits = clog_limits(record)
+        if limits is not None and not throttle_matches(record, limits):
+            operations.append(Operation(record.hash, THROTTLE, limits))
+
+    return operations
+
+
+def plan_unset_clog(records) -> list[Operation]:
+    """
+    Plan the writes that remove the clog from torrents above last tier
+    :param records: iterable of torrent records
+    :return: list of planned writes
+    """
+
+    return [Operation(record.hash, THROTTLE, UNCLOG_LIMITS) for record in records
+            if record.progress == 100 and record.ratio > 50 and not throttle_matches(record, UNCLOG_LIMITS)]
+
+
+def set_clog(config: dict,
+             resume: bool = False
+             ) -> None:
     """
     Set bandwidth limits to torrents above last tier
     :param config: valid configuration dictionary
+    :param resume: reapply only the pending writes of an interrupted run
     """
 
     client = get_client(config)
-    limits = {
-        "seed_idle_limit": 30,
-        "seed_idle_mode": 2,
-        "seed_ratio_limit": 5,
-        "seed_ratio_mode": 2,
-        "upload_limit": 50,
-        "upload_limited": True
-    }
-
-    for torrent in get_torrents_list(client):
+    scheduler = get_scheduler(config)
 
-        # Check if torrent is complete
-        if torrent.progress != 100:
-            continue
+    def plan() -> list[Operation]:
+        return plan_set_clog(iter_records(client, scheduler))
 
-        elif 50 < torrent.ratio < 70:
-            change_upload_throttle(client, torrent.hashString, limits)
+    run_journaled(config, client, "clog-set", plan, scheduler, resume)
+    logging.info(f"Clog set: {scheduler.stats()}")
 
-        elif 70 < torrent.ratio:
-            limits["upload_limit"] = 25
-            change_upload_throttle(client, torrent.hashString, limits)
 
+def unset_clog(config: dict,
+               resume: bool = False
+               ) -> None:
+    """
+    Remove bandwidth limits from torrents above last tier
+    :param config: valid configuration dictionary
+    :param resume: reapply only the pending writes of an interrupted run
+    """
 
-def unset_clog(config: dict) -> None:
     client = get_client(config)
-    limits = {
-        "seed_idle_limit": 30,
-        "seed_idle_mode": 2,
-        "seed_ratio_limit": 5,
-        "seed_ratio_mode": 2,
-        "upload_limit": 50,
-        "upload_limited": False
-    }
-
-    for torrent in get_torrents_list(client):
-
-        if torrent.progress != 100:
-            continue
-
-        elif torrent.ratio > 50:
-            change_upload_throttle(client, torrent.hashString, limits)
\ No newline at end of file
+    scheduler = get_scheduler(config)
+
+    def plan() -> list[Operation]:
+        return plan_unset_clog(iter_records(client, scheduler))
+
+    run_journaled(config, client, "clog-unset", plan, scheduler, resume)
+    logging.info(f"Clog unset: {scheduler.stats()}")
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+import os
+import stat
+import time
+import queue
+import socket
+import logging
+import threading
+
+HASH_CHARS = frozenset("0123456789abcdef")
+
+
+def hook_options(config: dict) -> dict:
+    """
+    Get the optional Hook section with its defaults
+    :param config: valid configuration dictionary
+    :return: dictionary with socket, window and tags
+    """
+
+    options = config.get("Hook", {})
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or f"/tmp/transmission-lever-{os.getuid()}"
+    instance = config["Client"].get("name", "default").replace(os.sep, "_")
+
+    return {
+        "socket": options.get("socket") or os.path.join(runtime_dir, "transmission-lever", f"{instance}.sock"),
+        "window": float(options.get("window", 2.0)),
+        "tags": list(options.get("tags", []))
+    }
+
+
+def private_dir(path: str) -> None:
+    """
+    Create a directory only the current user can use, or check an existing one is
+    :param path: directory holding the hook socket
+    :return: None
+    """
+
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+    # under a shared parent anybody could have created it first
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"Refusing to use {path} for the hook socket, "
+                              f"it must be a directory owned by uid {os.getuid()} with mode 0700")
+
+
+def parse_hashes(data: str) -> list[str]:
+    """
+    Keep the valid info-hashes of a message
+    :param data: hashes separated by whitespace
+    :return: list of lowercase hashes
+    """
+
+    hashes = []
+    for word in data.split():
+        word = word.lower()
+        if len(word) == 40 and set(word) <= HASH_CHARS:
+            hashes.append(word)
+        else:
+            logging.warning(f"Ignoring invalid hash {word}")
+    return hashes
+
+
+def send_hashes(config: dict,
+                torrent_hashes: list[str]
+                ) -> bool:
+    """
+    Hand torrents to a running hook service
+    :param config: valid configuration dictionary
+    :param torrent_hashes: list of hashes
+    :return: True if the service received them, False if no service could be reached
+    """
+
+    path = hook_options(config)["socket"]
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(5)
+
+        try:
+            connection.connect(path)
+            connection.sendall("\n".join(torrent_hashes).encode() + b"\n")
+            connection.shutdown(socket.SHUT_WR)
+
+        # missing, stale, unreachable or not ours, the caller applies the policies itself
+        except OSError as e:
+            logging.info(f"No hook service at {path}: {e}")
+            return False
+
+        # delivered, falling back now would apply the policies twice
+        try:
+            reply = connection.recv(64).decode().strip()
+        except OSError as e:
+            logging.warning(f"Hook service at {path} did not confirm {len(torrent_hashes)} torrents: {e}")
+            return True
+
+    logging.info(f"Hook service {reply} for {len(torrent_hashes)} torrents")
+    return True
+
+
+def run_batch(config: dict,
+              torrent_hashes: list[str]
+              ) -> int:
+    """
+    Apply the category, tier and tag policies to a batch of torrents
+    with a single fetch and grouped writes
+    :param config: valid configuration dictionary
+    :param torrent_hashes: list of hashes
+    :return: number of RPC calls issued for the writes
+    """
+
+    # imported here, the send side runs once per finished torrent and only needs a socket
+    from transmission_lever.core.client import get_client, get_downloads_dir, get_scheduler
+    from transmission_lever.core.plan import LABELS, Operation, apply_operations
+    from transmission_lever.core.snapshot import get_snapshot
+    from transmission_lever.extra.category import plan_categories
+    from transmission_lever.extra.tag import tag_prefix
+    from transmission_lever.extra.tier import compile_tiers, plan_set_tiers
+
+    client = get_client(config)
+    scheduler = get_scheduler(config)
+    tags = [tag_prefix(config) + tag for tag in hook_options(config)["tags"]]
+
+    records = get_snapshot(client, scheduler, ids=list(dict.fromkeys(torrent_hashes)))
+    tagged = [record._replace(labels=record.labels + tuple(t for t in tags if t not in record.labels))
+              for record in records]
+
+    # the tier label writes already carry the tags, the other torrents get their own
+    operations = plan_categories(config, tagged, get_downloads_dir(client))
+    operations += plan_set_tiers(compile_tiers(config), tagged)
+    labelled = {o.hash for o in operations if o.op == LABELS}
+
+    for record, target in zip(records, tagged):
+        if target.labels != record.labels and record.hash not in labelled:
+            operations.append(Operation(record.hash, LABELS, target.labels))
+
+    calls = apply_operations(client, operations, scheduler, grouped=True)
+    logging.info(f"Hook batch of {len(records)} torrents: {len(operations)} writes in {calls} calls")
+
+    return calls
+
+
+def run_batches(config: dict,
+                batches: queue.Queue
+                ) -> None:
+    """
+    Apply the policies to the batches of the hook service until it stops,
+    the batches that piled up while one was running are merged into the next one
+    :param config: valid configuration dictionary
+    :param batches: queue of lists of hashes, None to stop
+    :return: None
+    """
+
+    stopping = False
+
+    while not stopping:
+        batch = batches.get()
+        if batch is None:
+            return
+
+        while not batches.empty():
+            more = batches.get()
+            if more is None:
+                stopping = True
+                break
+            batch = batch + more
+
+        try:
+            run_batch(config, batch)
+        except Exception as e:
+            logging.error(f"Hook batch of {len(batch)} torrents failed: {e}")
+
+
+def serve_hooks(config: dict) -> None:
+    """
+    Listen for hashes on the hook socket and apply the policies
+    to everything received within the window of the first one
+    :param config: valid configuration dictionary
+    :return: None
+    """
+
+    options = hook_options(config)
+    path, window = options["socket"], options["window"]
+
+    if config.get("Hook", {}).get("socket"):
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    else:
+        # the runtime directory and the one below it, the fallback under /tmp is predictable
+        private_dir(os.path.dirname(os.path.dirname(path)))
+        private_dir(os.path.dirname(path))
+    if os.path.exists(path):
+        os.unlink(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(128)
+    logging.warning(f"Hook service listening on {path} with a {window}s window")
+
+    # batches run on a worker, so every client gets its reply while category moves are slow
+    batches = queue.Queue()
+    worker = threading.Thread(target=run_batches, args=(config, batches), name="hook-batches")
+    worker.start()
+
+    pending, deadline = [], None
+
+    try:
+        while True:
+            server.settimeout(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+            try:
+                connection, _ = server.accept()
+
+            except socket.timeout:
+                batches.put(pending)
+                pending, deadline = [], None
+                continue
+
+            with connection:
+                connection.settimeout(5)
+                chunks = []
+                try:
+                    while chunk := connection.recv(4096):
+                        chunks.append(chunk)
+                except socket.timeout:
+                    logging.warning("Hook client timed out, using what it sent")
+
+                hashes = parse_hashes(b"".join(chunks).decode(errors="replace"))
+                pending.extend(hashes)
+                if hashes and deadline is None:
+                    deadline = time.monotonic() + window
+
+                try:
+                    connection.sendall(f"queued {len(pending)}\n".encode())
+                except OSError:
+                    pass
+
+    finally:
+        server.close()
+        os.unlink(path)
+
+        # the batch in progress and the hashes already queued are still applied
+        if pending:
+            batches.put(pending)
+        batches.put(None)
+        worker.join()
+
+
+def hook(config: dict,
+         torrent_hashes: list[str]
+         ) -> None:
+    """
+    Thin hook entry point, hands the torrents to the service or applies the policies itself
+    :param config: valid configuration dictionary
+    :param torrent_hashes: list of hashes, TR_TORRENT_HASH if empty
+    :return: None
+    """
+
+    torrent_hashes = parse_hashes(" ".join(torrent_hashes or [os.environ.get("TR_TORRENT_HASH", "")]))
+    if not torrent_hashes:
+        logging.warning("No torrent hash given to the hook")
+        return
+
+    if not send_hashes(config, torrent_hashes):
+        run_batch(config, torrent_hashes)
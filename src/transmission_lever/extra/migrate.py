@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+import time
+import logging
+
+from transmission_lever.core.client import get_client, get_scheduler
+from transmission_lever.core.journal import run_journaled
+from transmission_lever.core.plan import Operation, LABELS, group_operations
+from transmission_lever.core.snapshot import TorrentRecord, get_snapshot
+
+
+def parse_renames(pairs: list[str]) -> dict:
+    """
+    Parse a list of old=new pairs
+    :param pairs: list of strings in the form old=new
+    :return: dictionary of old names to new names
+    """
+
+    renames = {}
+    for pair in pairs or []:
+        old, sep, new = pair.partition('=')
+        if not sep or not old or not new:
+            raise ValueError(f"Invalid rename {pair}, expected old=new")
+        renames[old] = new
+    return renames
+
+
+def migrate_label(label: str,
+                  old_prefix: str,
+                  new_prefix: str,
+                  renames: dict
+                  ) -> str:
+    """
+    Rewrite a single label
+    :param label: name of the label
+    :param old_prefix: prefix to replace, None keeps prefixes
+    :param new_prefix: prefix replacing old_prefix
+    :param renames: dictionary of prefix to a dictionary of old names to new names
+    :return: rewritten label
+    """
+
+    if old_prefix and label.startswith(old_prefix):
+        label = new_prefix + label[len(old_prefix):]
+
+    for prefix, names in renames.items():
+        if label.startswith(prefix):
+            name = label[len(prefix):]
+            if name in names:
+                return prefix + names[name]
+
+    return label
+
+
+def plan_migration(records: list[TorrentRecord],
+                   old_prefix: str,
+                   new_prefix: str,
+                   renames: dict
+                   ) -> list[Operation]:
+    """
+    Plan the label rewrites of every torrent
+    :param records: list of torrent records
+    :param old_prefix: prefix to replace, None keeps prefixes
+    :param new_prefix: prefix replacing old_prefix
+    :param renames: dictionary of prefix to a dictionary of old names to new names
+    :return: list of planned writes
+    """
+
+    operations = []
+
+    for record in records:
+        # dict keeps order and drops labels that collide after the rewrite
+        labels = tuple(dict.fromkeys(migrate_label(label, old_prefix, new_prefix, renames)
+                                     for label in record.labels))
+
+        if labels != record.labels:
+            operations.append(Operation(record.hash, LABELS, labels))
+
+    return operations
+
+
+def migrate_labels(config: dict,
+                   old_prefix: str = None,
+                   new_prefix: str = None,
+                   category_renames: list[str] = None,
+                   tier_renames: list[str] = None,
+                   dry_run: bool = False,
+                   resume: bool = False
+                   ) -> list[Operation]:
+    """
+    Rewrite label prefixes and names of all torrents in grouped calls
+    :param config: valid configuration dictionary
+    :param old_prefix: prefix to replace, None keeps prefixes
+    :param new_prefix: prefix replacing old_prefix
+    :param category_renames: list of old=new category names
+    :param tier_renames: list of old=new tier names
+    :param dry_run: only print the summary
+    :param resume: reapply only the pending writes of an interrupted run
+    :return: list of planned writes, the reapplied ones when resuming
+    """
+
+    if (old_prefix is None) != (new_prefix is None):
+        raise ValueError("Both --from and --to are required to change a prefix")
+
+    prefixes = config['General']['prefix']
+    renames = {
+        prefixes['categories']: parse_renames(category_renames),
+        prefixes['tiers']: parse_renames(tier_renames)
+    }
+
+    # the labels of the prefix still in use would be rewritten too
+    if old_prefix is not None:
+        for kind, prefix in prefixes.items():
+            if old_prefix == prefix:
+                raise ValueError(f"Prefix {old_prefix} is still configured for {kind}, "
+                                 f"--from must be a prefix no longer in use")
+            if prefix.startswith(old_prefix) or old_prefix.startswith(prefix):
+                logging.warning(f"Prefix {old_prefix} overlaps the {kind} prefix {prefix}, "
+                                f"check the summary before applying")
+
+    client = get_client(config)
+    scheduler = get_scheduler(config)
+
+    def plan() -> list[Operation]:
+        records = get_snapshot(client, scheduler)
+        by_hash = {record.hash: record for record in records}
+        operations = plan_migration(records, old_prefix, new_prefix, renames)
+
+        rewrites = {}
+        for operation in operations:
+            for old in by_hash[operation.hash].labels:
+                new = migrate_label(old, old_prefix, new_prefix, renames)
+                if old != new:
+                    rewrites[(old, new)] = rewrites.get((old, new), 0) + 1
+
+        print(f"{len(operations)} of {len(records)} torrents to migrate "
+              f"in {len(group_operations(operations))} calls")
+        for (old, new), count in sorted(rewrites.items(), key=lambda item: -item[1]):
+            print(f"  {old} -> {new}: {count}")
+
+        return operations
+
+    if dry_run:
+        return plan()
+
+    # a resumed run does not plan, only the writes it reapplies are counted
+    start = time.monotonic()
+    operations = run_journaled(config, client, "label-migrate", plan, scheduler, resume, grouped=True)
+    elapsed = time.monotonic() - start
+
+    print(f"Migrated {len(operations)} torrents in {elapsed:.2f}s "
+          f"({len(operations) / max(elapsed, 1e-9):.0f} torrents/s)")
+
+    return operations
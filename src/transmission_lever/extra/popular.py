@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+import logging
+from typing import NamedTuple
+from types import MappingProxyType
+
+from transmission_lever.core.client import get_client, get_scheduler
+from transmission_lever.core.journal import run_journaled
+from transmission_lever.core.plan import Operation, LABELS, THROTTLE
+from transmission_lever.core.snapshot import SNAPSHOT_FIELDS, to_record, throttle_matches
+from transmission_lever.core.stream import iter_torrent_fields
+from transmission_lever.extra.tier import TierPolicy, compile_tiers
+
+# asked in the same torrent-get as the snapshot, never in a call of their own
+DEMAND_FIELDS = ["peersGettingFromUs", "webseedsSendingToUs", "trackerStats"]
+
+
+class Demand(NamedTuple):
+
+    """
+    This class represents how much a swarm wants a torrent right now,
+    tracker counts are -1 when no tracker reported them
+    """
+
+    peers: int
+    webseeds: int
+    seeders: int
+    leechers: int
+
+    @property
+    def wanted(self) -> bool:
+        return self.peers > 0 or self.webseeds > 0 or self.leechers > 0
+
+
+def to_demand(fields: dict) -> Demand:
+    """
+    Build the demand of a torrent from its raw RPC fields
+    :param fields: dictionary of torrent-get fields
+    :return: demand of the torrent
+    """
+
+    trackers = fields.get("trackerStats") or []
+
+    return Demand(
+        peers=fields.get("peersGettingFromUs", 0),
+        webseeds=fields.get("webseedsSendingToUs", 0),
+        seeders=max((t.get("seederCount", -1) for t in trackers), default=-1),
+        leechers=max((t.get("leecherCount", -1) for t in trackers), default=-1)
+    )
+
+
+def iter_demand(client, scheduler=None):
+    """
+    List all torrents with their demand in a single streamed call
+    :param client: valid transmission session
+    :param scheduler: run the calls through this scheduler, a default one if None
+    :return: generator of (record, demand) pairs
+    """
+
+    for fields in iter_torrent_fields(client, SNAPSHOT_FIELDS + DEMAND_FIELDS, scheduler):
+        yield to_record(fields), to_demand(fields)
+
+
+def plan_popularity(policy: TierPolicy,
+                    torrents
+                    ) -> list[Operation]:
+
+    """
+    Plan the writes that throttle tier torrents nobody asks for
+    and give back the tier limits to those with demand again
+    :param policy: compiled tier policy with not-popular limits
+    :param torrents: iterable of (record, demand) pairs
+    :return: list of planned writes
+    """
+
+    operations = []
+
+    for record, demand in torrents:
+
+        # Only complete torrents managed by the tiers
+        if record.progress != 100 or policy.free_label in record.labels:
+            continue
+
+        not_popular = policy.not_popular_label in record.labels
+
+        if demand.wanted:
+            if not not_popular:
+                continue
+
+            labels = tuple(label for label in record.labels if label != policy.not_popular_label)
+            operations.append(Operation(record.hash, LABELS, labels))
+
+            # above the last bound the torrent has no tier limits to go back to
+            tier = policy.classify(record.ratio)
+            if tier < 0:
+                logging.info(f"Ratio {record.ratio} out of bounds for torrent with hash {record.hash}")
+                limits = MappingProxyType(dict(policy.free_limits, bandwidth_priority=0))
+            else:
+                limits = MappingProxyType(dict(policy.limits[tier], bandwidth_priority=0))
+
+        else:
+            if not not_popular:
+                if not policy.label_set.intersection(record.labels):
+                    continue
+                operations.append(Operation(record.hash, LABELS, record.labels + (policy.not_popular_label,)))
+            limits = policy.not_popular_limits
+
+        if not throttle_matches(record, limits):
+            operations.append(Operation(record.hash, THROTTLE, limits))
+
+    return operations
+
+
+def freed_bandwidth(upload_limits: dict[str, int],
+                    operations: list[Operation]
+                    ) -> int:
+    """
+    Sum the upload limit taken from not-popular torrents
+    :param upload_limits: dictionary of hashes to current upload limits
+    :param operations: list of planned writes
+    :return: KiBps released to the swarms with demand, negative when granted back
+    """
+
+    freed = 0
+
+    for operation in operations:
+        if operation.op != THROTTLE:
+            continue
+        freed += upload_limits[operation.hash] - operation.target["upload_limit"]
+
+    return freed
+
+
+def set_popularity(config: dict,
+                   resume: bool = False
+                   ) -> None:
+
+    """
+    Throttle the tier torrents without demand in a single fetch
+    :param config: valid configuration dictionary
+    :param resume: reapply only the pending writes of an interrupted run
+    :return: None
+    """
+
+    policy = compile_tiers(config)
+    if policy.not_popular_limits is None:
+        raise ValueError("Missing not_popular limits in the General section of the configuration")
+
+    client = get_client(config)
+    scheduler = get_scheduler(config)
+
+    def plan() -> list[Operation]:
+        upload_limits = {}
+
+        def remember(torrents):
+            for record, demand in torrents:
+                upload_limits[record.hash] = record.upload_limit
+                yield record, demand
+
+        operations = plan_popularity(policy, remember(iter_demand(client, scheduler)))
+        logging.info(f"Not popular: {freed_bandwidth(upload_limits, operations)} KiBps freed "
+                     f"over {len(upload_limits)} torrents")
+        return operations
+
+    run_journaled(config, client, "tier-popular", plan, scheduler, resume, grouped=True)
+    logging.info(f"Not popular: {scheduler.stats()}")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import time
+from collections import Counter
+
+from transmission_lever.core.cleanup import prune_dirs
+from transmission_lever.core.client import get_client, get_downloads_dir, get_scheduler
+from transmission_lever.core.journal import run_journaled
+from transmission_lever.core.plan import Operation, LABELS, MOVE, START, THROTTLE, group_operations, count_operations
+from transmission_lever.core.snapshot import TorrentRecord, throttle_matches
+from transmission_lever.core.stream import iter_records
+from transmission_lever.extra.category import plan_categories
+from transmission_lever.extra.clog import clog_limits
+from transmission_lever.extra.tier import TierPolicy, compile_tiers, tier_targets
+from transmission_lever.extra.verify import verify_torrents
+
+
+def plan_activation(policy: TierPolicy,
+                    records: list[TorrentRecord],
+                    labels: dict[str, tuple]
+                    ) -> list[Operation]:
+    """
+    Plan the starts of paused torrents managed by the tiers, after the label writes
+    :param policy: compiled tier policy
+    :param records: list of torrent records
+    :param labels: dictionary of hashes to the labels they will have
+    :return: list of planned writes
+    """
+
+    return [Operation(record.hash, START, None) for record in records
+            if record.status == 'stopped'
+            and policy.label_set.intersection(labels.get(record.hash, record.labels))]
+
+
+def plan_throttles(policy: TierPolicy,
+                   records: list[TorrentRecord],
+                   stats: Counter,
+                   conflicts: Counter
+                   ) -> list[Operation]:
+    """
+    Resolve the tier and clog states of every torrent, then plan the writes that reach them,
+    a clog above the last tier overrides the throttle of the tier set
+    :param policy: compiled tier policy
+    :param records: list of torrent records
+    :param stats: counter of tier transitions and of the ones suppressed by hysteresis
+    :param conflicts: counter of the tier throttles overridden by a clog
+    :return: list of planned writes
+    """
+
+    # precedence is applied on the states and not on the writes, a torrent
+    # already clogged has no clog write to win over its tier throttle
+    tiers = {record.hash: (labels, limits) for record, labels, limits in tier_targets(policy, records, stats)}
+    operations = []
+
+    for record in records:
+        labels, limits = tiers.get(record.hash, (None, None))
+
+        clog = clog_limits(record)
+        if clog is not None:
+            if limits is not None and dict(limits) != dict(clog):
+                conflicts["tier"] += 1
+            limits = clog
+
+        if labels is not None and labels != record.labels:
+            operations.append(Operation(record.hash, LABELS, labels))
+            stats["transitions"] += 1
+
+        if limits is not None and not throttle_matches(record, limits):
+            operations.append(Operation(record.hash, THROTTLE, limits))
+
+    return operations
+
+
+def print_plan(operations: list[Operation]) -> None:
+    """
+    Print the grouped writes of a plan, one line per RPC call
+    :param operations: list of planned writes
+    :return: None
+    """
+
+    for group in group_operations(operations):
+        target = group[0].target
+        if target is not None and not isinstance(target, (str, tuple)):
+            target = ", ".join(f"{key}={value}" for key, value in target.items())
+        print(f"  {group[0].op} {target}: {len(group)} torrents")
+
+
+def reconcile(config: dict,
+              dry_run: bool = False,
+              resume: bool = False,
+              cleanup: bool = False,
+              verify: bool = False
+              ) -> list[Operation]:
+    """
+    Bring every torrent to the state of the category, tier, clog and activation
+    policies at once, from a single snapshot and with grouped writes
+    :param config: valid configuration dictionary
+    :param dry_run: only print the plan
+    :param resume: reapply only the pending writes of an interrupted run
+    :param cleanup: remove the local directories left empty by the moves
+    :param verify: recheck the moved data, a few torrents at a time
+    :return: list of planned writes
+    """
+
+    client = get_client(config)
+    scheduler = get_scheduler(config)
+    timings = {}
+    sources = {}
+    base_dir = None
+
+    def plan() -> list[Operation]:
+        nonlocal base_dir
+
+        start = time.perf_counter()
+        records = list(iter_records(client, scheduler))
+        base_dir = get_downloads_dir(client)
+        timings["snapshot"] = time.perf_counter() - start
+
+        policy = compile_tiers(config)
+        stats = Counter()
+        conflicts = Counter()
+
+        start = time.perf_counter()
+        moves = plan_categories(config, records, base_dir)
+        timings["category"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        throttles = plan_throttles(policy, records, stats, conflicts)
+        timings["tier"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        operations = moves + throttles
+        labels = {o.hash: o.target for o in throttles if o.op == LABELS}
+        operations.extend(plan_activation(policy, records, labels))
+        timings["activation"] = time.perf_counter() - start
+
+        moved = {o.hash for o in moves}
+        sources.update((r.hash, r.download_dir) for r in records if r.hash in moved)
+
+        print(f"{len(operations)} writes on {len({o.hash for o in operations})} of {len(records)} torrents "
+              f"in {len(group_operations(operations))} calls {count_operations(operations)}")
+        if conflicts["tier"]:
+            print(f"Tier throttles overridden by a clog: {conflicts['tier']}")
+        if stats["suppressed"]:
+            print(f"Tier transitions suppressed by hysteresis: {stats['suppressed']}")
+
+        return operations
+
+    if dry_run:
+        operations = plan()
+        print_plan(operations)
+
+    else:
+        start = time.perf_counter()
+        operations = run_journaled(config, client, "reconcile", plan, scheduler, resume, grouped=True)
+        timings["apply"] = time.perf_counter() - start - sum(timings.values())
+
+        # sources are only known when this run planned the moves
+        if cleanup and base_dir is not None:
+            prune_dirs({sources[o.hash] for o in operations if o.hash in sources}, base_dir)
+
+        if verify:
+            verify_torrents(config, client, list({o.hash for o in operations if o.op == MOVE}))
+
+    print(" ".join(f"{phase}={elapsed * 1000:.2f}ms" for phase, elapsed in timings.items()))
+
+    return operations
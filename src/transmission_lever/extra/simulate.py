@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+import json
+import time
+import logging
+from datetime import datetime
+from collections import Counter
+
+from transmission_lever.core.client import get_client, get_downloads_dir, get_scheduler
+from transmission_lever.core.plan import Operation, LABELS, THROTTLE, count_operations
+from transmission_lever.core.snapshot import TorrentRecord, get_snapshot
+from transmission_lever.extra.category import plan_categories
+from transmission_lever.extra.clog import plan_set_clog
+from transmission_lever.extra.tier import compile_tiers, plan_set_tiers
+
+
+def record_snapshot(config: dict,
+                    path: str
+                    ) -> None:
+
+    """
+    Append a field-limited snapshot of the session to a file
+    :param config: valid configuration dictionary
+    :param path: file where snapshots are appended, one json object per line
+    :return: None
+    """
+
+    client = get_client(config)
+    records = get_snapshot(client, get_scheduler(config))
+
+    line = {
+        "time": time.time(),
+        "instance": config["Client"].get("name"),
+        "download_dir": get_downloads_dir(client),
+        "fields": list(TorrentRecord._fields),
+        "rows": [list(record) for record in records]
+    }
+
+    with open(path, 'a') as file:
+        file.write(json.dumps(line, separators=(',', ':')) + '\n')
+
+    logging.info(f"Recorded {len(records)} torrents into {path}")
+
+
+def load_snapshots(path: str,
+                   instance: str = None):
+
+    """
+    Read recorded snapshots back one at a time
+    :param path: file where snapshots were appended
+    :param instance: only yield snapshots of this instance if given
+    :return: generator of (timestamp, download dir, list of torrent records)
+    """
+
+    with open(path, 'r') as file:
+        for line in file:
+            snapshot = json.loads(line)
+
+            if instance is not None and snapshot.get("instance") not in (None, instance):
+                continue
+
+            fields = snapshot["fields"]
+            records = []
+            for row in snapshot["rows"]:
+                record = dict(zip(fields, row))
+                record["labels"] = tuple(record["labels"])
+                records.append(TorrentRecord(**record))
+
+            yield snapshot["time"], snapshot["download_dir"], records
+
+
+def bandwidth_delta(records: list[TorrentRecord],
+                    operations: list[Operation]
+                    ) -> tuple[int, int, int]:
+
+    """
+    Measure how much upload bandwidth a list of throttle writes moves around
+    :param records: list of torrent records the writes were planned on
+    :param operations: list of planned writes
+    :return: KiB/s freed, KiB/s granted and number of limited/unlimited switches
+    """
+
+    by_hash = {record.hash: record for record in records}
+    freed, granted, switched = 0, 0, 0
+
+    for operation in operations:
+        if operation.op != THROTTLE:
+            continue
+
+        record = by_hash[operation.hash]
+        limits = operation.target
+
+        if record.upload_limited != limits["upload_limited"]:
+            switched += 1
+
+        elif limits["upload_limited"]:
+            delta = limits["upload_limit"] - record.upload_limit
+            if delta < 0:
+                freed -= delta
+            else:
+                granted += delta
+
+    return freed, granted, switched
+
+
+def simulate(config: dict,
+             path: str
+             ) -> list[dict]:
+
+    """
+    Replay recorded snapshots through the tier, clog and category policies in memory
+    :param config: configuration dictionary with the policies to evaluate
+    :param path: file where snapshots were appended
+    :return: list of reports, one per snapshot
+    """
+
+    reports = []
+    policy = compile_tiers(config)
+
+    for timestamp, download_dir, records in load_snapshots(path, config["Client"].get("name")):
+
+        start = time.perf_counter()
+        tier_stats = Counter()
+        tier_operations = plan_set_tiers(policy, records, tier_stats)
+        clog_operations = plan_set_clog(records)
+        category_operations = plan_categories(config, records, download_dir)
+        elapsed = time.perf_counter() - start
+
+        freed, granted, switched = bandwidth_delta(records, tier_operations + clog_operations)
+
+        report = {
+            "time": timestamp,
+            "torrents": len(records),
+            "tier": count_operations(tier_operations),
+            "clog": count_operations(clog_operations),
+            "category": count_operations(category_operations),
+            "tier_moves": sum(1 for o in tier_operations if o.op == LABELS),
+            "suppressed": tier_stats["suppressed"],
+            "freed": freed,
+            "granted": granted,
+            "switched": switched,
+            "elapsed": elapsed
+        }
+        reports.append(report)
+
+        print(f"{datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')} "
+              f"torrents={report['torrents']} "
+              f"tier={report['tier']} clog={report['clog']} category={report['category']} "
+              f"tier_moves={report['tier_moves']} suppressed={report['suppressed']} "
+              f"freed={freed}KiB/s granted={granted}KiB/s switched={switched} "
+              f"eval={elapsed * 1000:.2f}ms")
+
+    total = sum(r["elapsed"] for r in reports)
+    print(f"Replayed {len(reports)} snapshots in {total * 1000:.2f}ms")
+    return reports
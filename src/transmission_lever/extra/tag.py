@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+from transmission_lever.core.cache import open_cache
 from transmission_lever.core.label import mk_label, rm_label
 from transmission_lever.core.client import get_client
 
@@ -24,7 +25,7 @@ def mk_tag(config: dict,
     client = get_client(config)
 
     tag = tag_prefix(config) + tag_name
-    return mk_label(client, torrent_hash, tag)
+    return mk_label(client, torrent_hash, tag, open_cache(config, client, []))
 
 
 def rm_tag(config: dict,
@@ -43,5 +44,5 @@ def rm_tag(config: dict,
     client = get_client(config)
 
     tag = tag_prefix(config) + tag_name
-    return rm_label(client, torrent_hash, tag)
+    return rm_label(client, torrent_hash, tag, open_cache(config, client, []))
 
@@ -1,125 +1,339 @@
 # /usr/bin/env python
 
-from transmission_lever.core.label import fd_label, fd_regex_label, sw_label, rm_label
-from transmission_lever.core.client import get_client, get_torrents_list, start_torrent
-from transmission_lever.core.torrent import change_upload_throttle
+import logging
+from collections import Counter
+from bisect import bisect_right
+from itertools import batched
+from types import MappingProxyType
+from typing import Iterator
 
+from transmission_lever.core.client import get_client, get_scheduler
+from transmission_lever.core.journal import run_journaled
+from transmission_lever.core.plan import Operation, LABELS, THROTTLE, START
+from transmission_lever.core.snapshot import TorrentRecord, ratio_column, throttle_matches
+from transmission_lever.core.stream import iter_records
 
-def upd_tier(num: int,
-             config: dict,
-             torrent_hash: str
-             ) -> None:
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# records classified at once, enough to amortize numpy without holding the whole session
+BATCH_SIZE = 4096
+
+
+class TierPolicy:
 
     """
-    Change the label of a tier
-    :param num: the number of the tier
-    :param config: valid configuration dictionary
-    :param torrent_hash: hash of a single torrent
-    :return: None
+    This class represents the tier configuration compiled for classification,
+    a ratio is in tier i when bounds[i-1] <= ratio < bounds[i], and a torrent
+    only crosses bounds[i] once past it by margins[i] in either direction
     """
 
-    client = get_client(config)
-    prefix_char = config['General']['prefix']['tiers']
-    new_label = prefix_char + "tier-" + str(num)
-    old_label = prefix_char + "tier-" + str(num - 1)
+    def __init__(self,
+                 bounds: tuple,
+                 labels: tuple,
+                 limits: tuple,
+                 free_label: str,
+                 free_limits: MappingProxyType,
+                 not_popular_label: str = None,
+                 not_popular_limits: MappingProxyType = None,
+                 margins: tuple = None):
+
+        self.bounds = bounds
+        self.labels = labels
+        self.limits = limits
+        self.free_label = free_label
+        self.free_limits = free_limits
+        self.not_popular_label = not_popular_label
+        self.not_popular_limits = not_popular_limits
+        self.label_set = frozenset(labels)
+        self.index = {label: i for i, label in enumerate(labels)}
+        self.margins = margins or (0.0,) * len(bounds)
+        self.hysteresis = any(self.margins)
+
+        self._array = numpy.asarray(bounds, dtype=float) if numpy is not None else None
+
+    def classify(self, ratio: float) -> int:
+        """
+        Find the tier of a ratio
+        :param ratio: upload ratio of a torrent
+        :return: number of the tier, -1 if out of bounds
+        """
+
+        if ratio < 0:
+            return -1
+
+        tier = bisect_right(self.bounds, ratio)
+        return tier if tier < len(self.bounds) else -1
+
+    def classify_many(self, ratios: list[float]) -> list[int]:
+        """
+        Find the tier of every ratio, vectorized when numpy is installed
+        :param ratios: upload ratios of torrents
+        :return: list of tier numbers, -1 if out of bounds
+        """
+
+        if self._array is None:
+            return [self.classify(ratio) for ratio in ratios]
+
+        values = numpy.asarray(ratios, dtype=float)
+        tiers = numpy.searchsorted(self._array, values, side='right')
+        tiers[(values < 0) | (tiers >= len(self.bounds))] = -1
+        return tiers.tolist()
+
+    def current_tier(self, record: TorrentRecord) -> int:
+        """
+        Find the tier a torrent is labelled with
+        :param record: torrent record
+        :return: number of the tier, -1 if not labelled
+        """
+
+        for label in record.labels:
+            if label in self.index:
+                return self.index[label]
+        return -1
+
+    def settle(self, ratio: float, tier: int, current: int) -> int:
+        """
+        Hold a torrent in its current tier while its ratio is inside the hysteresis band
+        :param ratio: upload ratio of a torrent
+        :param tier: tier of the ratio without hysteresis
+        :param current: tier the torrent is labelled with, -1 if none
+        :return: number of the tier to apply
+        """
+
+        if current < 0 or tier < 0:
+            return tier
+
+        # promote only past the boundary by its margin
+        while tier > current and ratio < self.bounds[tier - 1] + self.margins[tier - 1]:
+            tier -= 1
 
-    sw_label(client, torrent_hash, old_label, new_label)
-    limits_array = config['Tiers']
-    limits = limits_array[num]
-    change_upload_throttle(client, torrent_hash, limits)
+        # demote only once the ratio drops below the band
+        while tier < current and ratio >= self.bounds[tier] - self.margins[tier]:
+            tier += 1
 
+        return tier
 
-def set_tiers(config: dict) -> None:
 
+def compile_tiers(config: dict) -> TierPolicy:
     """
-    Set bandwidth limits through tier labels
+    Compile the tier configuration once for a whole run
     :param config: valid configuration dictionary
-    :return: None
+    :return: compiled tier policy
     """
 
-    client = get_client(config)
     prefix = config['General']['prefix']['tiers'] + "tier-"
     tiers = config['Tiers']
+    not_popular = config['General'].get("not_popular")
+
+    return TierPolicy(
+        bounds=tuple(float(tier["seed_ratio_limit"]) for tier in tiers),
+        labels=tuple(prefix + str(i) for i in range(len(tiers))),
+        limits=tuple(MappingProxyType({k: v for k, v in tier.items() if k != "hysteresis"}) for tier in tiers),
+        free_label=prefix + "free",
+        free_limits=MappingProxyType(dict(config['General']["free"])),
+        not_popular_label=prefix + "not-popular",
+        not_popular_limits=MappingProxyType(dict(not_popular)) if not_popular else None,
+        margins=tuple(float(tier.get("hysteresis", 0)) for tier in tiers)
+    )
+
 
-    for torrent in get_torrents_list(client):
-        ratio = torrent.ratio
-        torrent_hash = torrent.hashString
-        free = fd_label(client, torrent_hash, prefix + "free")
-        progress = torrent.progress
+def tier_labels(policy: TierPolicy,
+                record: TorrentRecord,
+                tier: int
+                ) -> list[str]:
+    """
+    Get the labels of a torrent with its tier label replaced
+    :param policy: compiled tier policy
+    :param record: torrent record
+    :param tier: number of the new tier
+    :return: list of labels
+    """
+
+    labels = [label for label in record.labels if label not in policy.label_set]
 
-        # Check if torrent is complete
-        if progress != 100:
-            continue
+    # the not-popular label stays after the tier label, as added by tier popular
+    if policy.not_popular_label in labels:
+        labels.insert(labels.index(policy.not_popular_label), policy.labels[tier])
+    else:
+        labels.append(policy.labels[tier])
+    return labels
 
-        # Maintain Tier free
-        elif free:
-            limits = config['General']["free"]
-            change_upload_throttle(client, torrent_hash, limits)
 
-        # Set Tier 0
-        elif 0 <= ratio < tiers[0]["seed_ratio_limit"]:
-            upd_tier(0, config, torrent_hash)
+def tier_targets(policy: TierPolicy,
+                 records,
+                 stats: Counter = None
+                 ) -> Iterator[tuple[TorrentRecord, tuple, MappingProxyType]]:
 
-        # Set Tier i
-        else:
-            for i in range(1, len(tiers)):
-                new_seed_ratio_limit = tiers[i]["seed_ratio_limit"]
-                old_seed_ratio_limit = tiers[i-1]["seed_ratio_limit"]
+    """
+    Compute the labels and throttle every complete torrent should have in its tier
+    :param policy: compiled tier policy
+    :param records: iterable of torrent records, consumed in batches
+    :param stats: counter of the tier transitions suppressed by hysteresis
+    :return: generator of (record, labels, limits), labels are None when the tiers leave them alone
+    """
 
-                if old_seed_ratio_limit <= ratio < new_seed_ratio_limit:
-                    upd_tier(i, config, torrent_hash)
-                    break
+    stats = Counter() if stats is None else stats
 
-            else:
-                print(f"Ratio {ratio} out of bounds for torrent with hash {torrent_hash}")
+    # Only complete torrents are managed
+    for batch in batched((r for r in records if r.progress == 100), BATCH_SIZE):
+        tiers = policy.classify_many(ratio_column(batch))
 
+        for record, tier in zip(batch, tiers):
 
-def unset_tiers(config: dict) -> None:
+            # Maintain Tier free
+            if policy.free_label in record.labels:
+                yield record, None, policy.free_limits
+                continue
+
+            if tier < 0:
+                logging.info(f"Ratio {record.ratio} out of bounds for torrent with hash {record.hash}")
+                continue
+
+            # Set Tier i
+            if policy.hysteresis:
+                settled = policy.settle(record.ratio, tier, policy.current_tier(record))
+                if settled != tier:
+                    stats["suppressed"] += 1
+                tier = settled
+
+            limits = policy.limits[tier]
+
+            # Keep the not-popular throttle until demand comes back
+            if policy.not_popular_limits and policy.not_popular_label in record.labels:
+                limits = policy.not_popular_limits
+
+            yield record, tuple(tier_labels(policy, record, tier)), limits
+
+
+def plan_set_tiers(policy: TierPolicy,
+                   records,
+                   stats: Counter = None
+                   ) -> list[Operation]:
 
     """
-    Remove tier labels and reset upload limits
+    Plan the writes that put every complete torrent in its tier
+    :param policy: compiled tier policy
+    :param records: iterable of torrent records, consumed in batches
+    :param stats: counter of tier transitions and of the ones suppressed by hysteresis
+    :return: list of planned writes
+    """
+
+    operations = []
+    stats = Counter() if stats is None else stats
+
+    for record, labels, limits in tier_targets(policy, records, stats):
+        if labels is not None and labels != record.labels:
+            operations.append(Operation(record.hash, LABELS, labels))
+            stats["transitions"] += 1
+
+        if not throttle_matches(record, limits):
+            operations.append(Operation(record.hash, THROTTLE, limits))
+
+    return operations
+
+
+def plan_unset_tiers(policy: TierPolicy,
+                     records
+                     ) -> list[Operation]:
+
+    """
+    Plan the writes that remove tier labels and reset upload limits
+    :param policy: compiled tier policy
+    :param records: iterable of torrent records
+    :return: list of planned writes
+    """
+
+    operations = []
+
+    for record in records:
+        labels = tuple(label for label in record.labels
+                       if label not in policy.label_set and label != policy.not_popular_label)
+
+        if len(labels) != len(record.labels):
+            operations.append(Operation(record.hash, LABELS, labels))
+            operations.append(Operation(record.hash, THROTTLE, policy.free_limits))
+
+    return operations
+
+
+def plan_activate_tiers(policy: TierPolicy,
+                        records
+                        ) -> list[Operation]:
+
+    """
+    Plan the writes that resume paused torrents managed by the tier tags
+    :param policy: compiled tier policy
+    :param records: iterable of torrent records
+    :return: list of planned writes
+    """
+
+    return [Operation(record.hash, START, None) for record in records
+            if record.status == 'stopped' and policy.label_set.intersection(record.labels)]
+
+
+def set_tiers(config: dict,
+              resume: bool = False
+              ) -> None:
+
+    """
+    Set bandwidth limits through tier labels
     :param config: valid configuration dictionary
+    :param resume: reapply only the pending writes of an interrupted run
     :return: None
     """
 
     client = get_client(config)
-    prefix_char = config['General']['prefix']['tiers']
-    tiers = config['Tiers']
+    scheduler = get_scheduler(config)
 
-    for torrent in get_torrents_list(client):
-        torrent_hash = torrent.hashString
+    # printed with the plan, a resumed run only reapplies the journal
+    def plan() -> list[Operation]:
+        stats = Counter()
+        operations = plan_set_tiers(compile_tiers(config), iter_records(client, scheduler), stats)
+        print(f"Tier set: {stats['transitions']} transitions, "
+              f"{stats['suppressed']} suppressed by hysteresis, {len(operations)} writes")
+        return operations
 
-        for i in range(0, len(tiers)):
-            tier_label = prefix_char + "tier-" + str(i)
-            exists = fd_label(client, torrent_hash, tier_label)
+    run_journaled(config, client, "tier-set", plan, scheduler, resume)
 
-            if exists:
-                rm_label(client, torrent_hash, tier_label)
-                limits = config['General']["free"]
-                change_upload_throttle(client, torrent_hash, limits)
-                break
 
+def unset_tiers(config: dict,
+                resume: bool = False
+                ) -> None:
 
-def activate_tiers(config: dict) -> None:
+    """
+    Remove tier labels and reset upload limits
+    :param config: valid configuration dictionary
+    :param resume: reapply only the pending writes of an interrupted run
+    :return: None
+    """
+
+    client = get_client(config)
+    scheduler = get_scheduler(config)
+
+    def plan() -> list[Operation]:
+        return plan_unset_tiers(compile_tiers(config), iter_records(client, scheduler))
+
+    run_journaled(config, client, "tier-unset", plan, scheduler, resume)
+
+
+def activate_tiers(config: dict,
+                   resume: bool = False
+                   ) -> None:
 
     """
     Resume paused torrent managed by the tier tags
     :param config: valid configuration dictionary
+    :param resume: reapply only the pending writes of an interrupted run
     :return: None
     """
 
     client = get_client(config)
-    prefix_char = config['General']['prefix']['tiers']
-    tiers = config['Tiers']
-
-    for torrent in get_torrents_list(client):
-        torrent_hash = torrent.hashString
+    scheduler = get_scheduler(config)
 
-        for i in range(0, len(tiers)):
-            tier_label = prefix_char + "tier-" + str(i)
-            exists = fd_regex_label(client, torrent_hash, tier_label)
+    def plan() -> list[Operation]:
+        return plan_activate_tiers(compile_tiers(config), iter_records(client, scheduler))
 
-            if exists:
-                if torrent.status == 'stopped':
-                    start_torrent(client, torrent_hash)
-                    break
+    run_journaled(config, client, "tier-activate", plan, scheduler, resume)
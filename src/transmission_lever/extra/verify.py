@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+
+import os
+import time
+import logging
+from typing import NamedTuple
+from transmission_rpc import Client
+from transmission_rpc.torrent import get_status
+
+from transmission_lever.core.client import get_client
+
+VERIFY_FIELDS = ["id", "hashString", "name", "downloadDir", "totalSize", "percentDone", "status", "trackerStats"]
+
+# polled for every torrent in flight in a single torrent-get
+POLL_FIELDS = ["hashString", "status", "recheckProgress", "percentDone"]
+
+CHECKING = frozenset({"check pending", "checking"})
+
+ORDERS = ("smallest", "seeded")
+
+
+class VerifyTask(NamedTuple):
+
+    """
+    This class represents a torrent waiting for verification
+    """
+
+    hash: str
+    name: str
+    filesystem: str
+    size: int
+    seeders: int
+    done: float
+
+
+def filesystem_of(path: str) -> str:
+    """
+    Identify the filesystem holding a download directory
+    :param path: download directory of a torrent, as seen by the daemon
+    :return: device of the directory when it exists here, else the first component of the path
+    """
+
+    try:
+        return str(os.stat(path).st_dev)
+
+    # a remote daemon, its paths mean nothing here and walking up would always reach our root,
+    # the top level directory is usually its mount point
+    except OSError:
+        parts = [part for part in path.split("/") if part]
+        return f"/{parts[0]}" if parts else path
+
+
+def to_task(fields: dict) -> VerifyTask:
+    """
+    Build a verify task from the raw RPC fields of a torrent
+    :param fields: dictionary of torrent-get fields
+    :return: verify task
+    """
+
+    trackers = fields.get("trackerStats") or []
+
+    return VerifyTask(
+        hash=fields["hashString"],
+        name=fields["name"],
+        filesystem=filesystem_of(fields["downloadDir"]),
+        size=fields["totalSize"],
+        seeders=max((t.get("seederCount", -1) for t in trackers), default=-1),
+        done=fields["percentDone"]
+    )
+
+
+def priority(order: str):
+    """
+    Get the sort key of an order
+    :param order: smallest or seeded first
+    :return: sort key for verify tasks
+    """
+
+    if order == "seeded":
+        # a well seeded swarm misses us the least while we are checking
+        return lambda task: (-task.seeders, task.size)
+
+    return lambda task: (task.size, -task.seeders)
+
+
+class VerifyScheduler:
+
+    """
+    This class starts torrent-verify calls in priority order with a bounded
+    number of checks per filesystem, so the rest of the library keeps seeding,
+    and follows the checks in flight with one batched poll per interval
+    """
+
+    def __init__(self,
+                 client: Client,
+                 per_filesystem: int = 1,
+                 poll_interval: float = 5.0,
+                 order: str = "smallest"):
+
+        if order not in ORDERS:
+            raise ValueError(f"Unknown verify order {order}, expected one of {', '.join(ORDERS)}")
+
+        self.client = client
+        self.per_filesystem = max(1, per_filesystem)
+        self.poll_interval = poll_interval
+        self.key = priority(order)
+
+        self.queues = {}
+        self.in_flight = {}
+        self.results = {}
+        self.polls = 0
+        self.damaged = 0
+
+    def add(self, tasks) -> None:
+        """
+        Queue torrents for verification, a torrent already queued is ignored
+        :param tasks: iterable of verify tasks
+        :return: None
+        """
+
+        queued = {task.hash for queue in self.queues.values() for task in queue} | set(self.in_flight)
+
+        for task in tasks:
+            if task.hash in queued or task.hash in self.results:
+                continue
+            queued.add(task.hash)
+            self.queues.setdefault(task.filesystem, []).append(task)
+
+        for queue in self.queues.values():
+            # popped from the end, so the first in priority goes last
+            queue.sort(key=self.key, reverse=True)
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _start(self) -> None:
+        started = []
+
+        for filesystem, queue in self.queues.items():
+            busy = sum(1 for task in self.in_flight.values() if task.filesystem == filesystem)
+            while queue and busy < self.per_filesystem:
+                task = queue.pop()
+                self.in_flight[task.hash] = task
+                started.append(task.hash)
+                busy += 1
+
+        if started:
+            self.client.verify_torrent(started)
+            logging.info(f"Verify started on {len(started)} torrents, {self.pending()} queued")
+
+    def _poll(self) -> None:
+        self.polls += 1
+        torrents = self.client.get_torrents(ids=list(self.in_flight), arguments=POLL_FIELDS)
+        seen = set()
+        progress = []
+
+        for torrent in torrents:
+            fields = torrent.fields
+            seen.add(fields["hashString"])
+
+            if get_status(fields["status"]) in CHECKING:
+                progress.append(fields["recheckProgress"])
+                continue
+
+            task = self.in_flight.pop(fields["hashString"])
+            self.results[task.hash] = fields["percentDone"]
+
+            if fields["percentDone"] < task.done:
+                self.damaged += 1
+                logging.warning(f"Torrent with hash {fields['hashString']} is "
+                                f"{fields['percentDone'] * 100:.2f}% complete after verify")
+
+        # removed while waiting, there is nothing left to check
+        for torrent_hash in set(self.in_flight) - seen:
+            del self.in_flight[torrent_hash]
+            self.results[torrent_hash] = None
+
+        if progress:
+            logging.info(f"Verifying {len(progress)} torrents, "
+                         f"{sum(progress) / len(progress) * 100:.1f}% average progress")
+
+    def run(self) -> dict:
+        """
+        Verify every queued torrent
+        :return: dictionary of hashes to completion after verify, None if the torrent is gone
+        """
+
+        while self.pending() or self.in_flight:
+            self._start()
+            time.sleep(self.poll_interval)
+            self._poll()
+
+        return self.results
+
+
+def get_verify_scheduler(client: Client,
+                         config: dict
+                         ) -> VerifyScheduler:
+    """
+    Build the verify scheduler from the optional Verify section
+    :param client: valid transmission session
+    :param config: valid configuration dictionary
+    :return: verify scheduler
+    """
+
+    options = config.get("Verify", {})
+
+    return VerifyScheduler(client,
+                           per_filesystem=options.get("per_filesystem", 1),
+                           poll_interval=options.get("poll_interval", 5.0),
+                           order=options.get("order", "smallest"))
+
+
+def verify_torrents(config: dict,
+                    client: Client,
+                    torrent_hashes: list[str] = None
+                    ) -> dict:
+    """
+    Verify a set of torrents, i.e. the ones moved by a bulk command
+    :param config: valid configuration dictionary
+    :param client: valid transmission session
+    :param torrent_hashes: list of hashes to verify, None for every torrent
+    :return: dictionary of hashes to completion after verify
+    """
+
+    if torrent_hashes is not None and not torrent_hashes:
+        return {}
+
+    scheduler = get_verify_scheduler(client, config)
+    torrents = client.get_torrents(ids=torrent_hashes, arguments=VERIFY_FIELDS)
+
+    # torrents already checking are left to the daemon
+    scheduler.add(to_task(t.fields) for t in torrents if get_status(t.fields["status"]) not in CHECKING)
+
+    start = time.monotonic()
+    results = scheduler.run()
+
+    logging.info(f"Verified {len(results)} torrents in {time.monotonic() - start:.0f}s "
+                 f"with {scheduler.polls} polls, {scheduler.damaged} lost data")
+
+    return results
+
+
+def verify_library(config: dict,
+                   torrent_hashes: list[str] = None
+                   ) -> dict:
+    """
+    Verify the whole library or the given torrents, for periodic integrity sweeps
+    :param config: valid configuration dictionary
+    :param torrent_hashes: list of hashes to verify, None for every torrent
+    :return: dictionary of hashes to completion after verify
+    """
+
+    return verify_torrents(config, get_client(config), torrent_hashes or None)
@@ -1,15 +1,12 @@
 #!/usr/bin/env python
 
+import sys
 import logging
 import argparse
 
-from transmission_lever.core.client import get_client
-from transmission_lever.core.config import get_config
-from transmission_lever.core.label import mk_label, rm_label
-from transmission_lever.extra.category import mk_category, rm_category, enforce_categories
-from transmission_lever.extra.tag import mk_tag, rm_tag
-from transmission_lever.extra.tier import set_tiers, unset_tiers, activate_tiers
-from transmission_lever.extra.clog import set_clog, unset_clog
+# command modules pull transmission_rpc, sqlite3 and numpy, they are imported on dispatch
+from transmission_lever.core.config import get_config, get_instances
+from transmission_lever.core.fanout import run_on_instances, summarize
 
 
 def main():
@@ -28,6 +25,39 @@ def main():
                         action='store_true',
                         help='Show verbose output')
 
+    parser.add_argument('-c', '--config',
+                        type=str,
+                        help='Path of the configuration file to use')
+
+    parser.add_argument('-i', '--instance',
+                        type=str,
+                        help='Run only against the named instance')
+
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        help='Maximum number of instances handled at the same time')
+
+    #
+    # Flags shared by the commands that use them
+    #
+    resume_parser = argparse.ArgumentParser(add_help=False)
+
+    resume_parser.add_argument('-r', '--resume',
+                               action='store_true',
+                               help='Only reapply the pending writes of an interrupted bulk command')
+
+    cleanup_parser = argparse.ArgumentParser(add_help=False)
+
+    cleanup_parser.add_argument('--cleanup',
+                                action='store_true',
+                                help='Remove local directories left empty by category moves')
+
+    verify_moves_parser = argparse.ArgumentParser(add_help=False)
+
+    verify_moves_parser.add_argument('--verify',
+                                     action='store_true',
+                                     help='Recheck the data moved by the command')
+
     subparsers = parser.add_subparsers(help='Modifier on a torrent',
                                        dest='command',
                                        required=True)
@@ -41,13 +71,15 @@ def main():
                                             description=description,
                                             help='Manages categories of torrents')
 
-    category_subparsers = category_parser.add_subparsers(dest='category_command')
+    category_subparsers = category_parser.add_subparsers(dest='category_command',
+                                                         required=True)
 
     ###
     ### Create sub-sub-parser for 'category add' command
     ###
     category_add_parser = category_subparsers.add_parser('add',
-                                   help='Add a category to a torrent')
+                                                         parents=[cleanup_parser],
+                                                         help='Add a category to a torrent')
 
     category_add_parser.add_argument('name',
                                      type=str,
@@ -55,12 +87,13 @@ def main():
 
     category_add_parser.add_argument('hash',
                                      type=str,
-                                     help='Hash of the target torrent',)
+                                     help='Hash, unique hash prefix, id or name of the target torrent',)
 
     ###
     ### Create sub-sub-parser for 'category remove' command
     ###
     category_remove_parser = category_subparsers.add_parser('remove',
+                                                            parents=[cleanup_parser],
                                                             help='Remove a category from a torrent')
 
     category_remove_parser.add_argument('name',
@@ -69,13 +102,20 @@ def main():
 
     category_remove_parser.add_argument('hash',
                                         type=str,
-                                        help='Hash of the target torrent',)
+                                        help='Hash, unique hash prefix, id or name of the target torrent',)
 
     ###
     ### Create sub-sub-parser for 'category enforce' command
     ###
-    category_subparsers.add_parser('enforce',
-                                   help='Enforce a category on a torrent')
+    category_enforce_parser = category_subparsers.add_parser('enforce',
+                                                             parents=[resume_parser,
+                                                                      cleanup_parser,
+                                                                      verify_moves_parser],
+                                                             help='Enforce a category on a torrent')
+
+    category_enforce_parser.add_argument('--dry-run',
+                                         action='store_true',
+                                         help='Only print the moves, one line per destination')
 
     ##
     ## Create sub-parser for 'label' command
@@ -86,7 +126,8 @@ def main():
                                          description=description,
                                          help='Manages labels of torrents')
 
-    label_subparsers = label_parser.add_subparsers(dest='category_command')
+    label_subparsers = label_parser.add_subparsers(dest='label_command',
+                                                   required=True)
 
     ###
     ### Create sub-sub-parser for 'label add' command
@@ -100,7 +141,7 @@ def main():
 
     label_add_parser.add_argument('hash',
                                   type=str,
-                                  help='Hash of the target torrent')
+                                  help='Hash, unique hash prefix, id or name of the target torrent')
 
     ###
     ### Create sub-sub-parser for 'label remove' command
@@ -114,7 +155,38 @@ def main():
 
     label_remove_parser.add_argument('hash',
                                   type=str,
-                                  help='Hash of the target torrent')
+                                  help='Hash, unique hash prefix, id or name of the target torrent')
+
+    ###
+    ### Create sub-sub-parser for 'label migrate' command
+    ###
+    label_migrate_parser = label_subparsers.add_parser('migrate',
+                                                       parents=[resume_parser],
+                                                       help='Rewrite label prefixes and names of all torrents')
+
+    label_migrate_parser.add_argument('--from',
+                                      type=str,
+                                      dest='old_prefix',
+                                      help='Prefix to replace')
+
+    label_migrate_parser.add_argument('--to',
+                                      type=str,
+                                      dest='new_prefix',
+                                      help='New prefix')
+
+    label_migrate_parser.add_argument('--category',
+                                      type=str,
+                                      action='append',
+                                      help='Rename a category as old=new, can be repeated')
+
+    label_migrate_parser.add_argument('--tier',
+                                      type=str,
+                                      action='append',
+                                      help='Rename a tier as old=new, can be repeated')
+
+    label_migrate_parser.add_argument('--dry-run',
+                                      action='store_true',
+                                      help='Only print the summary')
 
     ##
     ## Create sub-parser for 'tag' command
@@ -125,7 +197,8 @@ def main():
                                        description=description,
                                        help='Manages tags of torrents')
 
-    tag_subparsers = tag_parser.add_subparsers(dest='tag_command')
+    tag_subparsers = tag_parser.add_subparsers(dest='tag_command',
+                                               required=True)
 
     ###
     ### Create sub-sub-parser for 'tag add' command
@@ -139,7 +212,7 @@ def main():
 
     tag_add_parser.add_argument('hash',
                                 type=str,
-                                help='Hash of the target torrent',)
+                                help='Hash, unique hash prefix, id or name of the target torrent',)
 
     ###
     ### Create sub-sub-parser for 'tag remove' command
@@ -153,7 +226,7 @@ def main():
 
     tag_remove_parser.add_argument('hash',
                                 type=str,
-                                help='Hash of the target torrent',)
+                                help='Hash, unique hash prefix, id or name of the target torrent',)
 
     ##
     ## Create sub-parser for 'tier' command
@@ -164,36 +237,49 @@ def main():
                                         description=description,
                                         help='Manages upload limit based on ratio')
 
-    tier_subparsers = tier_parser.add_subparsers(dest='tier_command')
+    tier_subparsers = tier_parser.add_subparsers(dest='tier_command',
+                                                 required=True)
 
     ###
     ### Create sub-sub-parser for 'tier set' command
     ###
     tier_subparsers.add_parser('set',
+                               parents=[resume_parser],
                                help='Add tier tags and apply upload limits')
 
     ###
     ### Create sub-sub-parser for 'tier unset' command
     ###
     tier_subparsers.add_parser('unset',
-                              help='Remove tier tags and reset upload limits')
+                               parents=[resume_parser],
+                               help='Remove tier tags and reset upload limits')
 
     ###
     ### Create sub-sub-parser for 'tier activate'
     ###
     tier_subparsers.add_parser('activate',
+                               parents=[resume_parser],
                                help='Start tier tagged torrents')
 
     ###
     ### Create sub-sub-parser for 'tier enforce'
     ###
     tier_subparsers.add_parser('enforce',
+                               parents=[resume_parser],
                                help='Alias for set + activate')
 
+    ###
+    ### Create sub-sub-parser for 'tier popular'
+    ###
+    tier_subparsers.add_parser('popular',
+                               parents=[resume_parser],
+                               help='Throttle tier torrents without demand')
+
     ##
     ## Create sub-parser 'clog' command
     ##
     clog_parser = subparsers.add_parser('clog',
+                                        parents=[resume_parser],
                                         help='Manages upload limit above tier bounds')
 
     clog_parser.add_argument('action',
@@ -201,6 +287,86 @@ def main():
                              choices=['set', 'unset'],
                              help='Action to perform')
 
+    ##
+    ## Create sub-parser 'record' command
+    ##
+    record_parser = subparsers.add_parser('record',
+                                          help='Append a snapshot of all torrents to a file')
+
+    record_parser.add_argument('file',
+                               type=str,
+                               help='File where snapshots are appended')
+
+    ##
+    ## Create sub-parser 'simulate' command
+    ##
+    description = 'Replays recorded snapshots through the policies without touching the daemon'
+
+    simulate_parser = subparsers.add_parser('simulate',
+                                            description=description,
+                                            help='Report the writes the policies would issue')
+
+    simulate_parser.add_argument('file',
+                                 type=str,
+                                 help='File with recorded snapshots')
+
+    ##
+    ## Create sub-parser 'reconcile' command
+    ##
+    description = 'Applies the category, tier, clog and activation policies from a single snapshot'
+
+    reconcile_parser = subparsers.add_parser('reconcile',
+                                             parents=[resume_parser, cleanup_parser, verify_moves_parser],
+                                             description=description,
+                                             help='Enforce every policy at once with grouped writes')
+
+    reconcile_parser.add_argument('--dry-run',
+                                  action='store_true',
+                                  help='Only print the plan')
+
+    ##
+    ## Create sub-parser 'hook' command
+    ##
+    description = 'Coalesces the torrent-done hooks of a batch into a single policy run'
+
+    hook_parser = subparsers.add_parser('hook',
+                                        description=description,
+                                        help='Apply category, tier and tag policies from the torrent-done hook')
+
+    hook_subparsers = hook_parser.add_subparsers(dest='hook_command',
+                                                 required=True)
+
+    ###
+    ### Create sub-sub-parser for 'hook serve' command
+    ###
+    hook_subparsers.add_parser('serve',
+                               help='Collect hashes on the hook socket and apply the policies in batches')
+
+    ###
+    ### Create sub-sub-parser for 'hook send' command
+    ###
+    hook_send_parser = hook_subparsers.add_parser('send',
+                                                  help='Hand torrents to the hook service')
+
+    hook_send_parser.add_argument('hashes',
+                                  type=str,
+                                  nargs='*',
+                                  help='Hashes of the torrents, TR_TORRENT_HASH if none')
+
+    ##
+    ## Create sub-parser 'verify' command
+    ##
+    description = 'Rechecks torrent data a few torrents at a time per filesystem'
+
+    verify_parser = subparsers.add_parser('verify',
+                                          description=description,
+                                          help='Recheck the data of the library or of some torrents')
+
+    verify_parser.add_argument('targets',
+                               type=str,
+                               nargs='*',
+                               help='Hash, unique hash prefix, id or name of the target torrents, all if none')
+
     # parse arguments
     args = parser.parse_args()
 
@@ -212,27 +378,104 @@ def main():
         logging.basicConfig(level=logging.WARNING)
 
     # parse config file
-    cfg = get_config()
-    client = get_client(cfg)
+    cfg = get_config(args.config)
+    instances = get_instances(cfg, args.instance)
+
+    # a targeted command only runs on the instance holding its torrents
+    targets = [args.hash] if getattr(args, 'hash', None) else getattr(args, 'targets', None)
+    if targets and len(instances) > 1:
+        from transmission_lever.core.resolve import TargetError, locate_targets
+
+        try:
+            args.located = locate_targets(instances, targets, workers=args.workers)
+        except TargetError as e:
+            logging.error(e)
+            sys.exit(1)
+
+        instances = [i for i in instances if i["Client"]["name"] in args.located]
+
+    results = run_on_instances(instances, dispatch, args, workers=args.workers)
+    stats = summarize(results)
+
+    if stats["instances"] > 1:
+        for result in results:
+            state = 'ok' if result.ok else 'failed'
+            print(f"{result.name}: {state} in {result.elapsed:.2f}s")
+
+        print(f"{stats['succeeded']}/{stats['instances']} instances succeeded, "
+              f"slowest took {stats['slowest']:.2f}s")
+
+    if stats["failed"]:
+        sys.exit(1)
+
+
+def dispatch(cfg: dict,
+             args: argparse.Namespace
+             ) -> None:
+    """
+    Run the parsed command against a single instance
+    :param cfg: config dictionary with a single Client section
+    :param args: parsed command line arguments
+    :return: None
+    """
+
+    # already resolved by main when several instances were searched
+    located = getattr(args, 'located', None)
+    if located is not None:
+        args = argparse.Namespace(**vars(args))
+        if args.command == 'verify':
+            args.targets = located[cfg["Client"]["name"]]
+        else:
+            args.hash = located[cfg["Client"]["name"]][0]
+
+    target = getattr(args, 'hash', None)
+    if target is not None:
+        from transmission_lever.core.resolve import is_full_hash
+
+        if not is_full_hash(target):
+            from transmission_lever.core.cache import open_cache
+            from transmission_lever.core.client import get_client
+            from transmission_lever.core.resolve import resolve_target
+
+            client = get_client(cfg)
+            args = argparse.Namespace(**vars(args))
+            args.hash = resolve_target(client, target, open_cache(cfg, client))
 
     if args.command == 'category':
+        from transmission_lever.extra.category import mk_category, rm_category, enforce_categories
+
         if args.category_command == 'add':
-            mk_category(cfg, args.hash, args.name)
+            mk_category(cfg, args.hash, args.name, args.cleanup)
 
         elif args.category_command == 'remove':
-            rm_category(cfg, args.hash, args.name)
+            rm_category(cfg, args.hash, args.name, args.cleanup)
 
         elif args.category_command == 'enforce':
-            enforce_categories(cfg)
+            enforce_categories(cfg, args.resume, args.cleanup, args.verify, args.dry_run)
 
     elif args.command == 'label':
+        if args.label_command in ('add', 'remove'):
+            from transmission_lever.core.cache import open_cache
+            from transmission_lever.core.client import get_client
+            from transmission_lever.core.label import mk_label, rm_label
+
         if args.label_command == 'add':
-            mk_label(client, args.hash, args.name)
+            client = get_client(cfg)
+            mk_label(client, args.hash, args.name, open_cache(cfg, client, []))
 
         elif args.label_command == 'remove':
-            rm_label(client, args.hash, args.name)
+            client = get_client(cfg)
+            rm_label(client, args.hash, args.name, open_cache(cfg, client, []))
+
+        elif args.label_command == 'migrate':
+            from transmission_lever.extra.migrate import migrate_labels
+
+            migrate_labels(cfg, args.old_prefix, args.new_prefix, args.category, args.tier,
+                           args.dry_run, args.resume)
 
     elif args.command == 'tag':
+        from transmission_lever.extra.tag import mk_tag, rm_tag
+
         if args.tag_command == 'add':
             mk_tag(cfg, args.hash, args.name)
 
@@ -240,25 +483,75 @@ def main():
             rm_tag(cfg, args.hash, args.name)
 
     elif args.command == 'tier':
+        from transmission_lever.extra.tier import set_tiers, unset_tiers, activate_tiers
+
         if args.tier_command == 'set':
-            set_tiers(cfg)
+            set_tiers(cfg, args.resume)
 
         elif args.tier_command == 'unset':
-            unset_tiers(cfg)
+            unset_tiers(cfg, args.resume)
 
         elif args.tier_command == 'activate':
-            activate_tiers(cfg)
+            activate_tiers(cfg, args.resume)
 
         elif args.tier_command == 'enforce':
-            set_tiers(cfg)
-            activate_tiers(cfg)
+            set_tiers(cfg, args.resume)
+            activate_tiers(cfg, args.resume)
+
+        elif args.tier_command == 'popular':
+            from transmission_lever.extra.popular import set_popularity
+
+            set_popularity(cfg, args.resume)
 
     elif args.command == 'clog':
+        from transmission_lever.extra.clog import set_clog, unset_clog
+
         if args.action == 'set':
-            set_clog(cfg)
+            set_clog(cfg, args.resume)
 
         elif args.action == 'unset':
-            unset_clog(cfg)
+            unset_clog(cfg, args.resume)
+
+    elif args.command == 'record':
+        from transmission_lever.extra.simulate import record_snapshot
+
+        record_snapshot(cfg, args.file)
+
+    elif args.command == 'simulate':
+        from transmission_lever.extra.simulate import simulate
+
+        simulate(cfg, args.file)
+
+    elif args.command == 'reconcile':
+        from transmission_lever.extra.reconcile import reconcile
+
+        reconcile(cfg, args.dry_run, args.resume, args.cleanup, args.verify)
+
+    elif args.command == 'hook':
+        if args.hook_command == 'serve':
+            from transmission_lever.extra.hook import serve_hooks
+
+            serve_hooks(cfg)
+
+        elif args.hook_command == 'send':
+            from transmission_lever.extra.hook import hook
+
+            hook(cfg, args.hashes)
+
+    elif args.command == 'verify':
+        from transmission_lever.core.resolve import is_full_hash, resolve_target
+        from transmission_lever.extra.verify import verify_library
+
+        targets = args.targets
+        if not all(is_full_hash(target) for target in targets):
+            from transmission_lever.core.cache import open_cache
+            from transmission_lever.core.client import get_client
+
+            client = get_client(cfg)
+            cache = open_cache(cfg, client)
+            targets = [resolve_target(client, target, cache) for target in targets]
+        verify_library(cfg, targets)
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+import pytest
+
+from transmission_lever.core import journal
+from transmission_lever.core.journal import Journal, verify_pending
+from transmission_lever.core.plan import Operation, LABELS, THROTTLE, MOVE, START
+from transmission_lever.core.snapshot import TorrentRecord
+
+HASH_A = "a" * 40
+HASH_B = "b" * 40
+HASH_C = "c" * 40
+
+LIMITS = {
+    "upload_limit": 100,
+    "upload_limited": True,
+    "seed_idle_limit": 30,
+    "seed_idle_mode": 2,
+    "seed_ratio_limit": 2,
+    "seed_ratio_mode": 1
+}
+
+
+def record(torrent_hash: str, **fields) -> TorrentRecord:
+    values = {
+        "id": 1,
+        "hash": torrent_hash,
+        "name": "torrent",
+        "ratio": 1.0,
+        "progress": 100.0,
+        "status": "seeding",
+        "labels": (),
+        "download_dir": "/data/torrents",
+        "upload_limit": 0,
+        "upload_limited": False,
+        "seed_idle_limit": 0,
+        "seed_idle_mode": 0,
+        "seed_ratio_limit": 0.0,
+        "seed_ratio_mode": 0,
+        "size": 1
+    }
+    values.update(fields)
+    return TorrentRecord(**values)
+
+
+@pytest.fixture
+def log(tmp_path):
+    return Journal(str(tmp_path / "state" / "journal.jsonl"))
+
+
+def test_pending_round_trip(log):
+    operations = [
+        Operation(HASH_A, LABELS, ("@movies", "%1")),
+        Operation(HASH_A, THROTTLE, LIMITS),
+        Operation(HASH_B, MOVE, "/data/movies"),
+        Operation(HASH_B, START, None)
+    ]
+    log.plan(operations)
+
+    assert log.pending() == operations
+
+
+def test_pending_skips_done(log):
+    operations = [Operation(HASH_A, LABELS, ("@movies",)),
+                  Operation(HASH_B, LABELS, ("@tv",)),
+                  Operation(HASH_C, MOVE, "/data/tv")]
+    log.plan(operations)
+    log.done(operations[1])
+    log.done(operations[2])
+
+    assert log.pending() == [operations[0]]
+
+
+def test_pending_done_needs_same_target(log):
+    log.plan([Operation(HASH_A, LABELS, ("@movies",))])
+    log.done(Operation(HASH_A, LABELS, ("@tv",)))
+
+    assert log.pending() == [Operation(HASH_A, LABELS, ("@movies",))]
+
+
+def test_pending_deduplicates(log):
+    operation = Operation(HASH_A, THROTTLE, LIMITS)
+    # the same limits in another key order are the same write
+    log.plan([operation, Operation(HASH_A, THROTTLE, dict(reversed(LIMITS.items()))), operation])
+
+    assert log.pending() == [operation]
+
+
+def test_pending_skips_truncated_line(log):
+    operations = [Operation(HASH_A, LABELS, ("@movies",)), Operation(HASH_B, LABELS, ("@tv",))]
+    log.plan(operations)
+    log.done(operations[0])
+
+    # a crash while writing the done record of the second write
+    with open(log.path, 'a') as file:
+        file.write('{"event":"done","hash":"' + HASH_B + '","op":"lab')
+
+    assert log.pending() == [operations[1]]
+
+
+def test_clear(log):
+    log.plan([Operation(HASH_A, START, None)])
+    assert log.exists()
+
+    log.clear()
+    assert not log.exists()
+
+    # clearing twice or writing again after a clear is fine
+    log.clear()
+    log.plan([Operation(HASH_B, START, None)])
+    assert log.pending() == [Operation(HASH_B, START, None)]
+
+
+def test_verify_pending(log, monkeypatch):
+    operations = [
+        Operation(HASH_A, LABELS, ("@movies",)),
+        Operation(HASH_A, THROTTLE, LIMITS),
+        Operation(HASH_B, MOVE, "/data/movies/"),
+        Operation(HASH_B, START, None),
+        Operation(HASH_C, LABELS, ("@tv",))
+    ]
+    log.plan(operations)
+
+    records = [
+        # labels already written, throttle not yet
+        record(HASH_A, labels=("@movies",)),
+        # moved, still stopped
+        record(HASH_B, download_dir="/data/movies", status="stopped")
+        # HASH_C was removed from the daemon
+    ]
+    requested = []
+
+    def get_snapshot(client, scheduler=None, ids=None):
+        requested.append(sorted(ids))
+        return records
+
+    monkeypatch.setattr(journal, "get_snapshot", get_snapshot)
+
+    assert verify_pending(None, log) == [operations[1], operations[3]]
+    assert requested == [[HASH_A, HASH_B, HASH_C]]
+
+
+def test_verify_pending_satisfied(log, monkeypatch):
+    operation = Operation(HASH_A, THROTTLE, LIMITS)
+    log.plan([operation])
+
+    limited = record(HASH_A, **{key: value for key, value in LIMITS.items()})
+    monkeypatch.setattr(journal, "get_snapshot", lambda client, scheduler=None, ids=None: [limited])
+
+    assert verify_pending(None, log) == []
+
+
+def test_verify_pending_without_pending(log, monkeypatch):
+    operation = Operation(HASH_A, START, None)
+    log.plan([operation])
+    log.done(operation)
+
+    def get_snapshot(client, scheduler=None, ids=None):
+        raise AssertionError("nothing to verify, no fetch expected")
+
+    monkeypatch.setattr(journal, "get_snapshot", get_snapshot)
+
+    assert verify_pending(None, log) == []
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+import pytest
+
+from transmission_lever.core.resolve import TargetError, TargetNotFound, TorrentIndex, is_full_hash
+
+ENTRIES = [
+    (1, "ABCDEF0123456789abcdef0123456789abcdef01", "Big Buck Bunny 1080p"),
+    (2, "abcd990123456789abcdef0123456789abcdef02", "Big Buck Bunny 720p"),
+    (3, "1234ff0123456789abcdef0123456789abcdef03", "Sintel [2010] 4K"),
+    (12, "5678ee0123456789abcdef0123456789abcdef04", "Tears of Steel"),
+    (1234, "9999dd0123456789abcdef0123456789abcdef05", "Elephants Dream")
+]
+
+
+@pytest.fixture
+def index():
+    return TorrentIndex(ENTRIES)
+
+
+def hash_of(torrent_id: int) -> str:
+    return next(entry[1].lower() for entry in ENTRIES if entry[0] == torrent_id)
+
+
+def test_exact_id(index):
+    assert index.resolve("2") == hash_of(2)
+    # an exact id wins over the hash starting with the same digits
+    assert index.resolve("1234") == hash_of(1234)
+
+
+def test_digits_as_prefix(index):
+    # no torrent with that id, so the digits are a hash prefix
+    assert index.resolve("5678") == hash_of(12)
+
+
+def test_hash_prefix(index):
+    assert index.resolve("abcdef") == hash_of(1)
+    assert index.resolve("ABCD99") == hash_of(2)
+    assert index.resolve(hash_of(3)) == hash_of(3)
+
+
+def test_short_prefix_is_a_name(index):
+    # too short for a prefix, tried as a name and nothing is called that
+    with pytest.raises(TargetNotFound):
+        index.resolve("abc")
+
+
+def test_ambiguous_prefix(index):
+    with pytest.raises(TargetError) as error:
+        index.resolve("abcd")
+
+    assert not isinstance(error.value, TargetNotFound)
+    assert hash_of(1) in str(error.value) and hash_of(2) in str(error.value)
+
+
+def test_name_words(index):
+    assert index.resolve("tears steel") == hash_of(12)
+    assert index.resolve("BUNNY 720p") == hash_of(2)
+    assert index.resolve("sintel") == hash_of(3)
+
+
+def test_name_glob(index):
+    assert index.resolve("*dream") == hash_of(1234)
+    assert index.resolve("Sintel [[]2010]*") == hash_of(3)
+
+
+def test_ambiguous_name(index):
+    with pytest.raises(TargetError, match="2 torrents match"):
+        index.resolve("bunny")
+    with pytest.raises(TargetError, match="2 torrents match"):
+        index.resolve("big*")
+
+
+def test_not_found(index):
+    for target in ("7", "ffff", "cosmos laundromat", "*.iso", "--"):
+        with pytest.raises(TargetNotFound):
+            index.resolve(target)
+
+
+def test_ambiguity_lists_ten_candidates():
+    entries = [(i, f"{i:040x}", f"Episode {i}") for i in range(1, 16)]
+
+    with pytest.raises(TargetError) as error:
+        TorrentIndex(entries).resolve("episode")
+
+    assert "15 torrents match" in str(error.value)
+    assert "... 5 more" in str(error.value)
+
+
+def test_is_full_hash():
+    assert is_full_hash(ENTRIES[0][1])
+    assert not is_full_hash(ENTRIES[0][1][:-1])
+    assert not is_full_hash("g" * 40)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+import json
+import pytest
+from transmission_rpc.error import TransmissionError
+
+from transmission_lever.core import stream
+from transmission_lever.core.snapshot import SNAPSHOT_FIELDS
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1000, 100_000]
+
+
+class FakeResponse:
+
+    """
+    This class represents a streamed HTTP response serving a fixed body
+    """
+
+    def __init__(self, body: bytes, status_code: int = 200):
+
+        self.body = body
+        self.status_code = status_code
+
+    def iter_content(self, size: int):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class FakeSession:
+
+    """
+    This class represents an HTTP session answering every post with the same body
+    """
+
+    def __init__(self, body: bytes):
+
+        self.body = body
+        self.queries = []
+
+    def post(self, url, json=None, headers=None, timeout=None, stream=False):
+        self.queries.append(json)
+        return FakeResponse(self.body)
+
+
+class FakeClient:
+
+    """
+    This class represents the parts of a transmission client read by the stream
+    """
+
+    def __init__(self, body: bytes, rpc_version: int):
+
+        self.rpc_version = rpc_version
+        self._http_session = FakeSession(body)
+        self._url = "http://localhost:9091/transmission/rpc"
+        self._http_header = {}
+        self.timeout = 30
+
+
+def torrent(i: int) -> dict:
+    return {
+        "id": i,
+        "hashString": f"{i:040x}",
+        # multi-byte characters, json delimiters and the key searched for inside values
+        "name": f'Ünïcødé "torrents" [{i}], {{x}} 日本語 \\ {i}',
+        "uploadRatio": i / 3,
+        "percentDone": 1.0,
+        "status": 6,
+        "labels": ["@movies", f"%{i % 3}"] if i % 2 else [],
+        "downloadDir": f"/data/torrents/{i}",
+        "uploadLimit": 100,
+        "uploadLimited": bool(i % 2),
+        "seedIdleLimit": 30,
+        "seedIdleMode": 2,
+        "seedRatioLimit": 2.0,
+        "seedRatioMode": 1,
+        "totalSize": 10 ** 9 + i,
+        "bandwidthPriority": 0
+    }
+
+
+def object_body(torrents: list[dict]) -> bytes:
+    return json.dumps({"arguments": {"torrents": torrents}, "result": "success"},
+                      ensure_ascii=False).encode()
+
+
+def table_body(torrents: list[dict]) -> bytes:
+    table = [SNAPSHOT_FIELDS] + [[t[field] for field in SNAPSHOT_FIELDS] for t in torrents]
+    return json.dumps({"arguments": {"torrents": table}, "result": "success"},
+                      ensure_ascii=False, indent=1).encode()
+
+
+@pytest.fixture(params=CHUNK_SIZES)
+def chunk_size(request, monkeypatch):
+    monkeypatch.setattr(stream, "CHUNK_SIZE", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("count", [0, 1, 25])
+def test_object_format(chunk_size, count):
+    torrents = [torrent(i) for i in range(count)]
+    client = FakeClient(object_body(torrents), rpc_version=15)
+
+    assert list(stream.iter_torrent_fields(client)) == torrents
+    assert "format" not in client._http_session.queries[0]["arguments"]
+
+
+@pytest.mark.parametrize("count", [1, 25])
+def test_table_format(chunk_size, count):
+    torrents = [torrent(i) for i in range(count)]
+    client = FakeClient(table_body(torrents), rpc_version=17)
+
+    assert list(stream.iter_torrent_fields(client)) == torrents
+    assert client._http_session.queries[0]["arguments"]["format"] == "table"
+
+
+def test_table_format_without_torrents(chunk_size):
+    for torrents in ([], [SNAPSHOT_FIELDS]):
+        body = json.dumps({"arguments": {"torrents": torrents}, "result": "success"}).encode()
+        assert list(stream.iter_torrent_fields(FakeClient(body, rpc_version=17))) == []
+
+
+def test_records(chunk_size):
+    torrents = [torrent(i) for i in range(5)]
+    records = list(stream.iter_records(FakeClient(table_body(torrents), rpc_version=17)))
+
+    assert [r.hash for r in records] == [t["hashString"] for t in torrents]
+    assert records[1].labels == ("@movies", "%1")
+    assert records[1].name == torrents[1]["name"]
+
+
+def test_missing_torrents(chunk_size):
+    client = FakeClient(b'{"arguments": {}, "result": "no such method"}', rpc_version=17)
+
+    with pytest.raises(TransmissionError):
+        list(stream.iter_torrent_fields(client))
+
+
+@pytest.mark.parametrize("cut", [1, 30, 200])
+def test_truncated_response(chunk_size, cut):
+    body = object_body([torrent(i) for i in range(3)])
+    # cut inside the torrents array, what follows it is never read
+    end = body.rindex(b"]")
+    client = FakeClient(body[:end + 1 - cut], rpc_version=15)
+
+    with pytest.raises(TransmissionError):
+        list(stream.iter_torrent_fields(client))